@@ -0,0 +1,217 @@
+
+# --- Imports ---
+
+import time
+
+# --- General definitions ---
+
+message_cooldown = 3.0 # Minimum time between two utterances of the same message (in seconds)
+value_cooldown = 5.0 # Minimum time between two utterances of the same value (in seconds)
+state_dwell = 0.3 # How long a new state or quantized value has to hold before it is announced (in seconds), so flickering detections aren't spoken
+
+# --- Announcer ---
+
+class Announcer:
+
+    """
+    Decides what is worth saying: messages only when the state changes, values only when they change by a whole quantization step,
+    both only once the change has held for the dwell time, and neither more often than their cooldown.
+
+    """
+
+    def __init__(self, say, show = None, cooldown = message_cooldown, value_cooldown = value_cooldown, dwell = state_dwell):
+
+        """
+        Creates an announcer.
+
+        Arguments:
+            "say": Called with every message that should be announced (printed and spoken)
+            "show": Called with the new message on every state change, even if it isn't spoken (e.g. the video status text)
+            "cooldown": The minimum time between two utterances of the same message (in seconds)
+            "value_cooldown": The minimum time between two utterances of the same value key (in seconds)
+            "dwell": How long a new state or value has to hold before it is announced (in seconds)
+
+        Returns:
+            None
+
+        """
+
+        self.say = say
+        self.show = show
+        self.cooldown = cooldown
+        self.value_cooldown = value_cooldown
+        self.dwell = dwell
+
+        self.shown_message = None # The newest message passed to "show"
+        self.current_message = None # The current state (held for the dwell time)
+        self.pending = False # The current state hasn't been spoken yet (it came up during its cooldown)
+        self.held_back = False # The cooldown held back the pending state (already counted in "suppressed")
+        self.last_spoken_times = {} # Time each message or value key was last spoken
+
+        self.last_values = {} # Last spoken quantized value, by key
+        self.held_back_values = {} # Quantized value the cooldown is holding back, by key (already counted in "suppressed")
+        self.candidates = {} # Newest state (key None) or quantized value, and the time it appeared: (value, time)
+
+        self.spoken = 0
+        self.suppressed = 0
+
+    def ready(self, key, cooldown, now):
+
+        """
+        Checks whether the cooldown of a message or value key is over.
+
+        Arguments:
+            "key": The message or value key
+            "cooldown": Its cooldown (in seconds)
+            "now": The current monotonic time
+
+        Returns:
+            "ready": True if it may be spoken again
+
+        """
+
+        return now - self.last_spoken_times.get(key, -cooldown) >= cooldown
+
+    def settled(self, key, value, now):
+
+        """
+        Checks whether a state or quantized value has held for the dwell time.
+
+        Arguments:
+            "key": None for the state, otherwise the value key
+            "value": The newest state message or quantized value
+            "now": The current monotonic time
+
+        Returns:
+            "settled": True if "value" has been the newest one for at least the dwell time
+
+        """
+
+        candidate = self.candidates.get(key)
+
+        if candidate is None or candidate[0] != value:
+            self.candidates[key] = (value, now)
+            return self.dwell <= 0
+
+        return now - candidate[1] >= self.dwell
+
+    def speak(self, key, message, now, priority = None):
+
+        """
+        Says a message and starts the cooldown of its key.
+
+        Arguments:
+            "key": The message or value key
+            "message": The text to say
+            "now": The current monotonic time
+            "priority": Passed on to "say" if set
+
+        Returns:
+            None
+
+        """
+
+        self.last_spoken_times[key] = now
+        self.spoken += 1
+
+        if priority is None:
+            self.say(message)
+        else:
+            self.say(message, priority)
+
+    def announce(self, message, priority = None):
+
+        """
+        Announces a state message once it has held for the dwell time, if it differs from the current state,
+        or if it came up during its cooldown and the cooldown is over now.
+
+        Arguments:
+            "message": The message describing the state (e.g. "Turning right...")
+            "priority": Passed on to "say" if set (e.g. to let a warning cut off other speech)
+
+        Returns:
+            "spoken": True if the message was announced
+
+        """
+
+        now = time.monotonic()
+
+        if self.show is not None and message != self.shown_message: # The video status follows every change right away
+            self.shown_message = message
+            self.show(message)
+
+        if not self.settled(None, message, now): # Flickered in, it may be gone next frame
+            return False
+
+        if message != self.current_message: # A state transition
+            self.current_message = message
+            self.pending = True
+            self.held_back = False
+
+        if not self.pending:
+            return False
+
+        if not self.ready(message, self.cooldown, now):
+
+            if not self.held_back: # Counted once per transition, not once per frame
+                self.held_back = True
+                self.suppressed += 1
+
+            return False
+
+        self.pending = False
+        self.speak(message, message, now, priority)
+
+        return True
+
+    def announce_value(self, key, template, value, step, priority = None):
+
+        """
+        Announces a number, quantized to "step", if the quantized value changed since it was last spoken and has held for the dwell time.
+
+        Arguments:
+            "key": The name of the value (values with the same key share a cooldown)
+            "template": The message, with "{}" where the value goes (e.g. "Person takes up {:.2f} of the total frame size")
+            "value": The value
+            "step": The quantization step
+            "priority": Passed on to "say" if set
+
+        Returns:
+            "spoken": True if the value was announced
+
+        """
+
+        now = time.monotonic()
+        quantized = round(round(value / step) * step, 6)
+
+        if not self.settled(key, quantized, now) or quantized == self.last_values.get(key):
+            return False
+
+        if not self.ready(key, self.value_cooldown, now):
+
+            if self.held_back_values.get(key) != quantized: # Counted once per changed value, not once per frame
+                self.held_back_values[key] = quantized
+                self.suppressed += 1
+
+            return False
+
+        self.held_back_values.pop(key, None)
+        self.last_values[key] = quantized
+        self.speak(key, template.format(quantized), now, priority)
+
+        return True
+
+    def get_stats(self):
+
+        """
+        Gets how many announcements were spoken and how many state transitions or changed values the cooldowns held back.
+
+        Arguments:
+            None
+
+        Returns:
+            "stats": A dictionary with the spoken and suppressed counts
+
+        """
+
+        return {"spoken": self.spoken, "suppressed": self.suppressed}
@@ -0,0 +1,434 @@
+
+# --- Imports ---
+
+import sys
+import json
+import time
+import types
+import argparse
+import tracemalloc
+import numpy
+
+import object_detection
+from tensor_log import ReplayIMX500, ReplayCamera
+
+# --- General definitions ---
+
+benchmark_input_size = (320, 320) # Model input (width, height) of the synthetic network
+benchmark_labels = ["person", "chair", "couch", "tv", "bottle"] # The first labels, the rest are filled up with "class N"
+
+nanodet_anchor_count = 3598 # Anchors of a 416 x 416 NanoDet-Plus (52² + 26² + 13² + 7²)
+nanodet_box_channels = 32 # 4 sides x (reg_max + 1) distribution bins
+nanodet_input_size = 416
+nanodet_strides = (8, 16, 32, 64)
+
+# --- Synthetic detector outputs ---
+
+class SyntheticLog:
+
+    """
+    Stands in for a tensor log, serving synthetic detector outputs to the replay backend.
+
+    """
+
+    def __init__(self, frames, input_size, intrinsics):
+
+        """
+        Creates a synthetic log.
+
+        Arguments:
+            "frames": A list of output tensor lists, one per frame
+            "input_size": The (width, height) of the model input
+            "intrinsics": The network intrinsics of the synthetic model
+
+        Returns:
+            None
+
+        """
+
+        self.frames = frames
+        self.input_size = input_size
+        self.intrinsics = intrinsics
+
+        width, height = object_detection.camera_frame_width, object_detection.camera_frame_height
+        self.metadata = {"ScalerCrop": [0, 0, width, height], "CoordinateTransform": [width, 0.0, height, 0.0, width, height]} # Normalized coordinates map straight onto the frame
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return index + 1, index / 30, dict(self.metadata), self.frames[index]
+
+def get_intrinsics(postprocess, class_count):
+
+    """
+    Creates the network intrinsics of a synthetic model.
+
+    Arguments:
+        "postprocess": "" for SSD MobileNet style outputs, "nanodet" for NanoDet style outputs
+        "class_count": The number of classes of the model
+
+    Returns:
+        "intrinsics": The network intrinsics
+
+    """
+
+    labels = (benchmark_labels + [f"class {index}" for index in range(class_count)])[:class_count]
+
+    return types.SimpleNamespace(task = "object detection", labels = labels, bbox_normalization = True, bbox_order = "yx", postprocess = postprocess, ignore_dash_labels = False, preserve_aspect_ratio = False, inference_rate = 30)
+
+def make_ssd_frames(frame_count, box_count, detection_count, class_count, random):
+
+    """
+    Creates SSD MobileNet style outputs: boxes (1, N, 4), scores (1, N), classes (1, N) and a count (1, 1).
+
+    Arguments:
+        "frame_count": The number of frames
+        "box_count": The number of boxes in every output tensor
+        "detection_count": How many of them score above the detection threshold
+        "class_count": The number of classes of the model
+        "random": The NumPy random generator
+
+    Returns:
+        "frames": A list of output tensor lists
+
+    """
+
+    input_width, input_height = benchmark_input_size
+    frames = []
+
+    for _ in range(frame_count):
+
+        top_left = random.uniform(0, 0.7, (box_count, 2))
+        size = random.uniform(0.05, 0.3, (box_count, 2))
+        boxes = numpy.concatenate((top_left, top_left + size), axis = 1) * input_height # (y0, x0, y1, x1) in input pixels
+
+        scores = random.uniform(0.0, 0.5, box_count)
+        scores[:detection_count] = random.uniform(0.6, 1.0, min(detection_count, box_count)) # SSD outputs are sorted by score
+
+        classes = random.integers(0, min(class_count, len(benchmark_labels)), box_count)
+
+        frames.append([boxes[None].astype(numpy.float32), scores[None].astype(numpy.float32), classes[None].astype(numpy.float32), numpy.array([[box_count]], dtype = numpy.float32)])
+
+    return frames
+
+def make_nanodet_frames(frame_count, class_count, random):
+
+    """
+    Creates NanoDet style outputs: one (1, anchors, classes + box distribution) tensor.
+
+    Arguments:
+        "frame_count": The number of frames
+        "class_count": The number of classes of the model
+        "random": The NumPy random generator
+
+    Returns:
+        "frames": A list of output tensor lists
+
+    """
+
+    return [[random.uniform(0, 1, (1, nanodet_anchor_count, class_count + nanodet_box_channels)).astype(numpy.float32)] for _ in range(frame_count)]
+
+# --- NanoDet stand-in ---
+
+def get_nanodet_anchors():
+
+    """
+    Creates the anchor points of a 416 x 416 NanoDet-Plus, like picamera2 does.
+
+    Arguments:
+        None
+
+    Returns:
+        "anchors": An (anchors, 4) array of (y, x, stride, stride) rows
+
+    """
+
+    anchors = []
+
+    for stride in nanodet_strides:
+        cells = numpy.arange(numpy.ceil(nanodet_input_size / stride)) * stride
+        y, x = numpy.meshgrid(cells, cells)
+        anchors.append(numpy.stack([y.ravel(), x.ravel(), numpy.full(y.size, stride), numpy.full(y.size, stride)], axis = -1))
+
+    return numpy.concatenate(anchors)
+
+nanodet_anchors = get_nanodet_anchors()
+
+def postprocess_nanodet_detection(outputs, conf = 0.0, iou_thres = 0.65, max_out_dets = 300):
+
+    """
+    Stands in for picamera2's "postprocess_nanodet_detection" when picamera2 isn't installed: the same decoding, thresholding
+    and non-maximum suppression steps in NumPy, so the NanoDet path costs about the same off the robot.
+
+    Arguments:
+        "outputs": The (1, anchors, classes + box distribution) output tensor
+        "conf": The confidence threshold
+        "iou_thres": The IoU threshold for non-maximum suppression
+        "max_out_dets": The maximum number of detections
+
+    Returns:
+        "results": A list with one (boxes, scores, classes) tuple per batch, the boxes as (y_min, x_min, y_max, x_max) in model pixels
+
+    """
+
+    class_count = outputs.shape[-1] - nanodet_box_channels
+    bin_count = nanodet_box_channels // 4
+
+    scores = 1 / (1 + numpy.exp(-outputs[..., :class_count]))
+
+    distribution = outputs[..., class_count:].reshape(outputs.shape[0], -1, 4, bin_count)
+    distribution = numpy.exp(distribution - distribution.max(axis = -1, keepdims = True))
+    distances = (distribution / distribution.sum(axis = -1, keepdims = True)) @ numpy.arange(bin_count, dtype = numpy.float32) * nanodet_anchors[:, 2:3]
+
+    results = []
+
+    for batch_distances, batch_scores in zip(distances, scores):
+
+        confidences = batch_scores.max(axis = 1)
+        keep = numpy.flatnonzero(confidences > conf)
+        keep = keep[numpy.argsort(-confidences[keep])]
+
+        left, top, right, bottom = batch_distances[keep].T
+        x, y = nanodet_anchors[keep, 0], nanodet_anchors[keep, 1]
+        boxes = numpy.stack([y - top, x - left, y + bottom, x + right], axis = 1) # (y_min, x_min, y_max, x_max)
+        classes = batch_scores[keep].argmax(axis = 1)
+
+        kept = non_maximum_suppression(boxes + classes[:, None] * 640, confidences[keep], iou_thres, max_out_dets) # Offset per class, so only boxes of the same class suppress each other
+
+        results.append((boxes[kept], confidences[keep][kept], classes[kept].astype(numpy.float32)))
+
+    return results
+
+def non_maximum_suppression(boxes, scores, iou_threshold, max_detections):
+
+    """
+    Greedy non-maximum suppression, like picamera2's "nms".
+
+    Arguments:
+        "boxes": An (N, 4) array of (y_min, x_min, y_max, x_max) boxes
+        "scores": Their confidence scores
+        "iou_threshold": Boxes overlapping a kept box more than this are dropped
+        "max_detections": The maximum number of boxes to keep
+
+    Returns:
+        "kept": The indices of the kept boxes, best first
+
+    """
+
+    y1, x1, y2, x2 = boxes.T
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = numpy.argsort(-scores)
+    kept = []
+
+    while order.size > 0 and len(kept) < max_detections:
+
+        index, rest = order[0], order[1:]
+        kept.append(index)
+
+        width = numpy.maximum(0.0, numpy.minimum(x2[index], x2[rest]) - numpy.maximum(x1[index], x1[rest]) + 1)
+        height = numpy.maximum(0.0, numpy.minimum(y2[index], y2[rest]) - numpy.maximum(y1[index], y1[rest]) + 1)
+        intersection = width * height
+
+        order = rest[intersection / (areas[index] + areas[rest] - intersection) <= iou_threshold]
+
+    return numpy.array(kept, dtype = int)
+
+def scale_boxes(boxes, h_image, w_image, h_model, w_model, preserve_aspect_ratio, normalized = True):
+
+    """
+    Stands in for picamera2's "scale_boxes" (without aspect ratio preservation, which the parser doesn't use).
+
+    Arguments:
+        "boxes": An (N, 4) array of (y_min, x_min, y_max, x_max) boxes
+        "h_image", "w_image": The size to scale to
+        "h_model", "w_model": The size of the model input
+        "preserve_aspect_ratio": Ignored
+        "normalized": If True, the boxes are normalized to the model input
+
+    Returns:
+        "boxes": The scaled boxes, clipped to the image
+
+    """
+
+    scale = numpy.array([h_image, w_image, h_image, w_image]) / numpy.array([h_model, w_model, h_model, w_model])
+
+    if normalized:
+        scale *= numpy.array([h_model, w_model, h_model, w_model])
+
+    return numpy.clip(boxes * scale, 0, [h_image, w_image, h_image, w_image])
+
+# --- Measurement ---
+
+def measure(stage, frame_count):
+
+    """
+    Runs a stage once per frame and measures its latency and memory allocations.
+
+    Arguments:
+        "stage": A function taking the frame index
+        "frame_count": The number of frames
+
+    Returns:
+        "results": A dictionary with latency percentiles (in microseconds) and allocated bytes per frame
+
+    """
+
+    for index in range(min(frame_count, 10)): # Warm up caches (labels, sprites, transforms)
+        stage(index)
+
+    latencies = numpy.empty(frame_count)
+
+    for index in range(frame_count):
+        start_time = time.perf_counter_ns()
+        stage(index)
+        latencies[index] = time.perf_counter_ns() - start_time
+
+    tracemalloc.start() # Measured separately, because tracing slows everything down
+    allocated_peaks = numpy.empty(frame_count)
+
+    for index in range(frame_count):
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        stage(index)
+        allocated_peaks[index] = tracemalloc.get_traced_memory()[1] - baseline
+
+    tracemalloc.stop()
+
+    p50, p90, p99 = numpy.percentile(latencies / 1000, [50, 90, 99])
+
+    return {
+        "p50_us": round(float(p50), 2),
+        "p90_us": round(float(p90), 2),
+        "p99_us": round(float(p99), 2),
+        "max_us": round(float(latencies.max() / 1000), 2),
+        "mean_allocated_peak_bytes": round(float(allocated_peaks.mean()), 1),
+        "max_allocated_peak_bytes": int(allocated_peaks.max())
+    }
+
+def benchmark_model(postprocess, frames, class_count, max_detections):
+
+    """
+    Benchmarks "parse_detections", "get_tracking_data" and "draw_overlay" on the given frames.
+
+    Arguments:
+        "postprocess": "" for SSD MobileNet style outputs, "nanodet" for NanoDet style outputs
+        "frames": A list of output tensor lists
+        "class_count": The number of classes of the model
+        "max_detections": The maximum number of detections per frame
+
+    Returns:
+        "results": A dictionary with the results of every stage
+
+    """
+
+    log = SyntheticLog(frames, benchmark_input_size, get_intrinsics(postprocess, class_count))
+    imx500 = ReplayIMX500(log)
+    camera = ReplayCamera(imx500, realtime = False)
+
+    session = object_detection.PerceptionSession(max_detections = max_detections, video_recording = False, imx500 = imx500, picam2 = camera, capture = False)
+
+    with session:
+
+        metadata = [log[index][2] for index in range(len(log))]
+
+        for index, frame_metadata in enumerate(metadata):
+            frame_metadata["ReplayOutputs"] = frames[index]
+
+        parsed = [] # Detections of every frame, copied so every stage sees the same input
+
+        for frame_metadata in metadata:
+            detections = object_detection.Detections(max_detections)
+            parsed_detections = object_detection.parse_detections(frame_metadata)
+            detections.records[:] = parsed_detections.records
+            detections.count = parsed_detections.count
+            parsed.append(detections)
+
+        def parse_stage(index):
+            object_detection.parse_detections(metadata[index])
+
+        def tracking_stage(index):
+            object_detection.latest_frame = (index + 1, index / 30, parsed[index]) # Publishes the frame like the capture thread does
+            object_detection.get_tracking_data()
+
+        image = numpy.zeros((object_detection.camera_frame_height, object_detection.camera_frame_width, 4), dtype = numpy.uint8)
+        object_detection.set_video_status_text("Person is too far away, trying to move forward...")
+
+        def draw_stage(index):
+            object_detection.draw_overlay(image, parsed[index])
+
+        results = {
+            "detections_per_frame": round(float(numpy.mean([detections.count for detections in parsed])), 2),
+            "parse_detections": measure(parse_stage, len(frames)),
+            "get_tracking_data": measure(tracking_stage, len(frames)),
+            "draw_overlay": measure(draw_stage, len(frames))
+        }
+
+        object_detection.set_video_status_text("")
+
+    return results
+
+def get_arguments():
+
+    """
+    Gets command line arguments for the benchmark.
+
+    Arguments:
+        None
+
+    Returns:
+        "arguments": The parsed command line arguments
+
+    """
+
+    parser = argparse.ArgumentParser(description = "Benchmarks the perception stages on synthetic detector outputs")
+
+    parser.add_argument("--model-style", choices = ["ssd", "nanodet", "all"], default = "all", help = "Which detector outputs to synthesize")
+    parser.add_argument("--frames", type = int, default = 500, help = "Number of frames per stage")
+    parser.add_argument("--boxes", type = int, default = 100, help = "Number of boxes in every SSD output tensor")
+    parser.add_argument("--detections", type = int, default = 10, help = "Number of SSD boxes above the detection threshold")
+    parser.add_argument("--classes", type = int, default = 80, help = "Number of classes of the model")
+    parser.add_argument("--max-detections", type = int, default = 10, help = "Maximum number of detections per frame")
+    parser.add_argument("--seed", type = int, default = 0, help = "Seed of the random generator")
+    parser.add_argument("--output", type = str, help = "Write the JSON results to this file instead of stdout")
+
+    return parser.parse_args()
+
+# --- Execution ---
+
+if __name__ == "__main__":
+
+    arguments = get_arguments()
+    random = numpy.random.default_rng(arguments.seed)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": numpy.__version__,
+        "parameters": vars(arguments),
+        "models": {}
+    }
+
+    if arguments.model_style in ("ssd", "all"):
+        frames = make_ssd_frames(arguments.frames, arguments.boxes, arguments.detections, arguments.classes, random)
+        results["models"]["ssd"] = benchmark_model("", frames, arguments.classes, arguments.max_detections)
+
+    if arguments.model_style in ("nanodet", "all"):
+        try:
+            object_detection.get_nanodet_postprocess()
+            postprocess = "picamera2"
+        except ImportError: # Off the robot, the NanoDet postprocessing runs on the NumPy stand-in
+            object_detection.get_nanodet_postprocess = lambda: (postprocess_nanodet_detection, scale_boxes)
+            postprocess = "stand-in"
+
+        frames = make_nanodet_frames(arguments.frames, arguments.classes, random)
+        results["models"]["nanodet"] = benchmark_model("nanodet", frames, arguments.classes, arguments.max_detections)
+        results["models"]["nanodet"]["postprocess"] = postprocess
+
+    output = json.dumps(results, indent = 2)
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,192 @@
+# --- Imports ---
+
+import sys
+import json
+import time
+import argparse
+import numpy
+
+import speaker
+from person_tracker import PersonTracker
+from follow_controller import FollowController
+
+# --- General definitions ---
+
+benchmark_modes = ["none", "thread", "process"] # No speech, speech in a thread of this process, speech in a separate process
+benchmark_detections = 5 # Person boxes per synthetic frame
+benchmark_target_areas = (0.35, 0.5) # The target area range of the follow controller (as in main.py)
+
+# --- Synthetic control loop ---
+
+def make_frames(frame_count, random):
+
+    """
+    Creates person boxes that drift slowly across the frame, so the tracker keeps its tracks.
+
+    Arguments:
+        "frame_count": The number of frames
+        "random": The random generator
+
+    Returns:
+        "frames": An array of shape (frame_count, benchmark_detections, 4) with normalized (x, y, w, h) boxes
+
+    """
+
+    start_boxes = numpy.column_stack((random.uniform(0.1, 0.6, (benchmark_detections, 2)), random.uniform(0.1, 0.3, (benchmark_detections, 2))))
+    drift = numpy.cumsum(random.normal(0, 0.002, (frame_count, benchmark_detections, 2)), axis = 0)
+
+    frames = numpy.repeat(start_boxes[numpy.newaxis], frame_count, axis = 0)
+    frames[:, :, :2] += drift
+
+    return frames.astype(numpy.float32)
+
+def run_loop(frames, rate, say = None, speech_interval = 0.5):
+
+    """
+    Runs a fixed-rate control loop (tracking and follow control on synthetic frames), optionally saying a new phrase every "speech_interval".
+
+    Arguments:
+        "frames": The synthetic frames from "make_frames", one per cycle
+        "rate": The loop rate (in Hz)
+        "say": Called with the phrase to say, or None for no speech
+        "speech_interval": The time between two phrases (in seconds)
+
+    Returns:
+        "results": A dictionary with the wake-up lateness, cycle time and period jitter (in microseconds) and the overrun count
+
+    """
+
+    tracker = PersonTracker()
+    controller = FollowController(*benchmark_target_areas)
+
+    period = 1 / rate
+    cycle_count = len(frames)
+
+    wake_times = numpy.empty(cycle_count)
+    lateness = numpy.empty(cycle_count)
+    cycle_times = numpy.empty(cycle_count)
+    overruns = 0
+
+    next_deadline = time.perf_counter() + period
+    next_speech_time = time.perf_counter()
+    phrase = 0
+
+    for index in range(cycle_count):
+
+        time.sleep(max(next_deadline - time.perf_counter(), 0.0))
+
+        wake_time = time.perf_counter()
+        wake_times[index] = wake_time
+        lateness[index] = wake_time - next_deadline
+
+        target_box = tracker.update(frames[index], wake_time)
+
+        if target_box is not None:
+            x, y, width, height = target_box
+            controller.update(float(width * height), float(x + width / 2), wake_time)
+
+        if say is not None and wake_time >= next_speech_time: # Every phrase is new, so it is synthesized rather than played from the cache
+            say(f"Person takes up {phrase} percent of the frame")
+            phrase += 1
+            next_speech_time += speech_interval
+
+        end_time = time.perf_counter()
+        cycle_times[index] = end_time - wake_time
+
+        next_deadline += period
+
+        if end_time > next_deadline:
+            overruns += 1
+
+    def summarize(values):
+        p50, p99 = numpy.percentile(values * 1e6, [50, 99])
+        return {"p50_us": round(float(p50), 1), "p99_us": round(float(p99), 1), "max_us": round(float(values.max() * 1e6), 1)}
+
+    return {
+        "cycles": cycle_count,
+        "phrases": phrase,
+        "wake_lateness": summarize(lateness),
+        "cycle_time": summarize(cycle_times),
+        "period_jitter_us": round(float(numpy.std(numpy.diff(wake_times)) * 1e6), 1), # Standard deviation of the time between two cycles
+        "overruns": overruns
+    }
+
+def benchmark_mode(mode, frames, rate, speech_interval):
+
+    """
+    Runs the control loop with speech in one of "benchmark_modes".
+
+    Arguments:
+        "mode": "none", "thread" or "process"
+        "frames": The synthetic frames
+        "rate": The loop rate (in Hz)
+        "speech_interval": The time between two phrases (in seconds)
+
+    Returns:
+        "results": The results of "run_loop", plus the speech statistics
+
+    """
+
+    if mode == "none":
+        return run_loop(frames, rate)
+
+    speaker.use_process(mode == "process")
+    speaker.say_async("Starting") # Starts the worker (and loads the engine) before the measurement
+    time.sleep(1.0)
+
+    results = run_loop(frames, rate, speaker.say_async, speech_interval)
+    results["speech"] = speaker.get_speech_stats()
+
+    speaker.stop_tts(graceful = True, timeout = 5.0)
+
+    return results
+
+def get_arguments():
+
+    """
+    Gets command line arguments for the benchmark.
+
+    Arguments:
+        None
+
+    Returns:
+        "arguments": The parsed command line arguments
+
+    """
+
+    parser = argparse.ArgumentParser(description = "Benchmarks the control loop jitter with speech synthesized in a thread or in a separate process")
+
+    parser.add_argument("--modes", type = str, default = ",".join(benchmark_modes), help = "Comma-separated modes to run (none, thread, process)")
+    parser.add_argument("--rate", type = float, default = 30, help = "Control loop rate (in Hz)")
+    parser.add_argument("--duration", type = float, default = 20, help = "Duration of every mode (in seconds)")
+    parser.add_argument("--speech-interval", type = float, default = 0.5, help = "Time between two phrases (in seconds)")
+    parser.add_argument("--seed", type = int, default = 0, help = "Seed of the random generator")
+    parser.add_argument("--output", type = str, help = "Write the JSON results to this file instead of stdout")
+
+    return parser.parse_args()
+
+# --- Execution ---
+
+if __name__ == "__main__":
+
+    arguments = get_arguments()
+    frames = make_frames(int(arguments.duration * arguments.rate), numpy.random.default_rng(arguments.seed))
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": numpy.__version__,
+        "parameters": vars(arguments),
+        "modes": {}
+    }
+
+    for mode in arguments.modes.split(","):
+        results["modes"][mode] = benchmark_mode(mode, frames, arguments.rate, arguments.speech_interval)
+
+    output = json.dumps(results, indent = 2)
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
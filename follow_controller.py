@@ -0,0 +1,316 @@
+
+# --- Imports ---
+
+import csv
+import argparse
+
+# --- General definitions ---
+
+distance_gains = (150.0, 30.0, 10.0) # (kp, ki, kd) from person area error to linear speed (in %)
+heading_gains = (100.0, 10.0, 5.0) # (kp, ki, kd) from horizontal offset to angular speed (in %)
+
+distance_output_limit = 100 # Maximum linear speed (in %)
+heading_output_limit = 60 # Maximum angular speed (in %)
+
+heading_tolerance = 0.03 # Horizontal offsets (normalized) this small are treated as centered
+tolerance_hysteresis = 0.2 # Once inside the tolerance band, the error has to leave it by this fraction of the tolerance to count as outside again
+
+maximum_time_step = 0.5 # Longer gaps between frames are integrated as this (in seconds), so a stall doesn't kick the integrator
+derivative_smoothing = 0.5 # Weight of the newest derivative measurement (0 = never update, 1 = no smoothing)
+
+log_fields = ["timestamp", "area", "x_center", "distance_error", "distance_p", "distance_i", "distance_d", "linear", "heading_error", "heading_p", "heading_i", "heading_d", "angular"]
+
+# --- PID controller ---
+
+class PIDController:
+
+    """
+    A PID controller integrating over the real time between measurements, with a clamped, conditionally integrated I term against windup,
+    and a zero output while the error stays inside the tolerance band.
+
+    """
+
+    def __init__(self, kp, ki, kd, output_limit, tolerance = 0.0):
+
+        """
+        Creates a controller.
+
+        Arguments:
+            "kp": The proportional gain
+            "ki": The integral gain (per second)
+            "kd": The derivative gain (in seconds)
+            "output_limit": The output is clamped to [-output_limit, output_limit]
+            "tolerance": Errors this small are treated as zero (with hysteresis, see "tolerance_hysteresis")
+
+        Returns:
+            None
+
+        """
+
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.tolerance = tolerance
+
+        self.reset()
+
+    def reset(self):
+
+        """
+        Forgets the integral, the derivative and the time of the last measurement.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.last_error = None
+        self.last_raw_error = None
+        self.last_timestamp = None
+        self.terms = (0.0, 0.0, 0.0) # Last (P, I, D) contributions to the output
+        self.output = 0.0
+        self.band = 0 # Which side of the tolerance band the error is on: 1 above, -1 below, 0 inside
+
+    def update(self, error, timestamp):
+
+        """
+        Updates the controller with a new error.
+
+        Arguments:
+            "error": The setpoint minus the measurement
+            "timestamp": The time the measurement was taken (in seconds), e.g. the capture time of the frame
+
+        Returns:
+            "output": The clamped controller output
+
+        """
+
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp: # Same frame as last time, nothing new to react to
+            return self.output
+
+        raw_error = error # The derivative follows the raw error, so entering the tolerance band doesn't kick it
+        band_edge = self.tolerance * (1 + tolerance_hysteresis) if self.band == 0 else self.tolerance # Noise around the edge doesn't flip in and out
+        in_tolerance = abs(error) <= band_edge
+
+        if in_tolerance:
+            error = 0.0
+
+        self.band = 0 if in_tolerance else (1 if raw_error > 0 else -1)
+
+        if self.last_timestamp is not None:
+
+            time_step = min(timestamp - self.last_timestamp, maximum_time_step)
+
+            self.derivative += derivative_smoothing * ((raw_error - self.last_raw_error) / time_step - self.derivative)
+
+            saturated = abs(self.output) >= self.output_limit and error * self.output > 0
+
+            if in_tolerance: # Close enough: stop pushing, otherwise the I term would drive straight through the tolerance band
+                self.integral = 0.0
+
+            elif not saturated: # Anti-windup: no integrating further into a saturated output
+                self.integral += error * time_step
+
+            if self.ki: # Anti-windup: the I term alone can never exceed the output limit
+                integral_limit = self.output_limit / abs(self.ki)
+                self.integral = max(-integral_limit, min(integral_limit, self.integral))
+
+        self.last_error = error
+        self.last_raw_error = raw_error
+        self.last_timestamp = timestamp
+
+        self.terms = (self.kp * error, self.ki * self.integral, self.kd * self.derivative)
+        self.output = max(-self.output_limit, min(self.output_limit, sum(self.terms)))
+
+        if in_tolerance: # The D term alone would keep the wheels twitching (the motor deadband compensation turns any output into a real push)
+            self.output = 0.0
+
+        return self.output
+
+# --- Follow controller ---
+
+class FollowController:
+
+    """
+    Turns the size and position of the followed person into linear and angular speeds, with one PID loop for the distance and one for the heading.
+
+    """
+
+    def __init__(self, target_minimum_area, target_maximum_area, log_path = None):
+
+        """
+        Creates a follow controller.
+
+        Arguments:
+            "target_minimum_area": The smallest comfortable person area (normalized)
+            "target_maximum_area": The largest comfortable person area (normalized)
+            "log_path": If set, every update is appended as a CSV row to this file (for tuning the step response)
+
+        Returns:
+            None
+
+        """
+
+        self.area_setpoint = (target_minimum_area + target_maximum_area) / 2 # The middle of the comfortable range
+        area_tolerance = (target_maximum_area - target_minimum_area) / 2 # Anywhere in the range is close enough
+
+        self.distance = PIDController(*distance_gains, distance_output_limit, area_tolerance)
+        self.heading = PIDController(*heading_gains, heading_output_limit, heading_tolerance)
+
+        self.log_file = None
+        self.log_writer = None
+
+        if log_path:
+            self.log_file = open(log_path, "w", newline = "")
+            self.log_writer = csv.writer(self.log_file)
+            self.log_writer.writerow(log_fields)
+
+    def update(self, area, x_center, timestamp):
+
+        """
+        Updates both loops with a new measurement of the person.
+
+        Arguments:
+            "area": The area of the person (normalized)
+            "x_center": The horizontal center of the person (normalized, 0.5 = middle)
+            "timestamp": The capture time of the frame (in seconds)
+
+        Returns:
+            "linear": The forward speed (in %, negative = backwards)
+            "angular": The turning speed (in %, positive = clockwise)
+
+        """
+
+        linear = self.distance.update(self.area_setpoint - area, timestamp) # Too small means too far away, so drive forward
+        angular = self.heading.update(x_center - 0.5, timestamp) # Right of the middle means turning clockwise
+
+        if self.log_writer is not None:
+            self.log_writer.writerow([timestamp, area, x_center, self.distance.last_error, *self.distance.terms, linear, self.heading.last_error, *self.heading.terms, angular])
+
+        return linear, angular
+
+    def reset(self):
+
+        """
+        Resets both loops, e.g. when the person is lost.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        self.distance.reset()
+        self.heading.reset()
+
+    def close(self):
+
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+            self.log_writer = None
+
+# --- Step response analysis ---
+
+def get_settling_time(timestamps, values, setpoint, tolerance):
+
+    """
+    Finds how long a response takes to settle within "tolerance" of "setpoint" for good.
+
+    Arguments:
+        "timestamps": The times of the samples (in seconds)
+        "values": The measured values
+        "setpoint": The value the response should settle at
+        "tolerance": The allowed distance from the setpoint
+
+    Returns:
+        "settling_time": The time from the first sample until the response stays within the tolerance, or None if it never settles
+
+    """
+
+    settled_since = None
+
+    for timestamp, value in zip(timestamps, values):
+
+        if abs(value - setpoint) > tolerance:
+            settled_since = None
+        elif settled_since is None:
+            settled_since = timestamp
+
+    if settled_since is None:
+        return None
+
+    return settled_since - timestamps[0]
+
+def simulate_step_response(controller, start_area, start_x_center, frame_rate = 30, duration = 10.0):
+
+    """
+    Simulates a person standing still while the robot follows them, with a simple kinematic model of the robot.
+
+    Arguments:
+        "controller": The follow controller
+        "start_area": The area of the person at the start (normalized)
+        "start_x_center": The horizontal center of the person at the start (normalized)
+        "frame_rate": The camera frame rate (in Hz)
+        "duration": The simulated time (in seconds)
+
+    Returns:
+        "samples": A list of (timestamp, area, x_center) tuples
+
+    """
+
+    area_rate = 0.004 # Area change per second at 1 % linear speed
+    x_center_rate = 0.006 # Horizontal shift per second at 1 % angular speed
+
+    area, x_center = start_area, start_x_center
+    samples = []
+
+    for frame in range(int(duration * frame_rate)):
+
+        timestamp = frame / frame_rate
+        samples.append((timestamp, area, x_center))
+
+        linear, angular = controller.update(area, x_center, timestamp)
+
+        area = max(0.01, area + linear * area_rate / frame_rate) # Driving forward makes the person bigger
+        x_center -= angular * x_center_rate / frame_rate # Turning clockwise moves them to the left in the frame
+
+    return samples
+
+# --- Test ---
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Analyzes the step response of the follow controller")
+    parser.add_argument("--log", type = str, help = "Analyze a CSV log written with --follow-log instead of simulating")
+    parser.add_argument("--start-area", type = float, default = 0.1, help = "Simulated person area at the start")
+    parser.add_argument("--start-x-center", type = float, default = 0.8, help = "Simulated horizontal center at the start")
+    arguments = parser.parse_args()
+
+    controller = FollowController(0.35, 0.5)
+
+    if arguments.log:
+        with open(arguments.log, newline = "") as file:
+            samples = [(float(row["timestamp"]), float(row["area"]), float(row["x_center"])) for row in csv.DictReader(file)]
+    else:
+        samples = simulate_step_response(controller, arguments.start_area, arguments.start_x_center)
+
+    if not samples:
+        raise SystemExit("No samples to analyze")
+
+    timestamps, areas, x_centers = zip(*samples)
+
+    distance_settling_time = get_settling_time(timestamps, areas, controller.area_setpoint, controller.distance.tolerance)
+    heading_settling_time = get_settling_time(timestamps, x_centers, 0.5, heading_tolerance)
+
+    print(f"Samples: {len(samples)} over {timestamps[-1] - timestamps[0]:.2f} s")
+    print(f"Distance: {areas[0]:.3f} -> {areas[-1]:.3f} (setpoint {controller.area_setpoint:.3f}), settled after: {distance_settling_time if distance_settling_time is None else f'{distance_settling_time:.2f} s'}")
+    print(f"Heading: {x_centers[0]:.3f} -> {x_centers[-1]:.3f} (setpoint 0.500), settled after: {heading_settling_time if heading_settling_time is None else f'{heading_settling_time:.2f} s'}")
@@ -0,0 +1,220 @@
+
+# --- Imports ---
+
+import time
+import numpy
+
+# --- Definitions ---
+
+COMMAND_CLAIM = 0 # Simulated command codes
+COMMAND_WRITE = 1
+COMMAND_GROUP_WRITE = 2
+COMMAND_PWM = 3
+COMMAND_FREE = 4
+
+COMMAND_NAMES = {COMMAND_CLAIM: "claim", COMMAND_WRITE: "write", COMMAND_GROUP_WRITE: "group_write", COMMAND_PWM: "pwm", COMMAND_FREE: "free"}
+
+command_dtype = numpy.dtype([("time", numpy.float64), ("command", numpy.uint8), ("pin", numpy.int16), ("value", numpy.float32)]) # One recorded command: monotonic time, command code, pin and level/bits/duty cycle
+
+class GPIOBusyError(Exception):
+
+    """
+    Raised by a backend when a pin is already claimed by someone else.
+
+    """
+
+# --- Real backend ---
+
+class LgpioBackend:
+
+    """
+    Drives the pins of the Raspberry Pi through lgpio.
+
+    """
+
+    def __init__(self, chip = 0):
+
+        """
+        Opens the GPIO chip.
+
+        Arguments:
+            "chip": The number of the GPIO chip
+
+        Returns:
+            None
+
+        """
+
+        import lgpio # Only imported when the real pins are used, so the rest of the code runs off the Pi
+
+        self.lgpio = lgpio
+        self.handle = lgpio.gpiochip_open(chip)
+
+    def call(self, function, *args):
+
+        """
+        Calls an lgpio function, turning "GPIO busy" errors into GPIOBusyError.
+
+        Arguments:
+            "function": The lgpio function
+            "args": Its arguments after the chip handle
+
+        Returns:
+            "result": What the function returned
+
+        """
+
+        try:
+            return function(self.handle, *args)
+
+        except self.lgpio.error as e:
+
+            if str(e) == "GPIO busy":
+                raise GPIOBusyError(str(e)) from e
+
+            raise
+
+    def claim_output(self, pin, level = 0):
+        self.call(self.lgpio.gpio_claim_output, pin, level)
+
+    def group_claim_output(self, pins, levels):
+        self.call(self.lgpio.group_claim_output, pins, levels)
+
+    def free(self, pin):
+        self.call(self.lgpio.gpio_free, pin)
+
+    def write(self, pin, level):
+        self.call(self.lgpio.gpio_write, pin, level)
+
+    def group_write(self, leader_pin, bits, mask):
+        self.call(self.lgpio.group_write, leader_pin, bits, mask)
+
+    def pwm(self, pin, frequency, duty_cycle):
+        return self.call(self.lgpio.tx_pwm, pin, frequency, duty_cycle)
+
+    def close(self):
+        self.lgpio.gpiochip_close(self.handle)
+
+# --- Simulated backend ---
+
+class SimulatedBackend:
+
+    """
+    Stands in for the GPIO pins, recording every command with a monotonic timestamp in an in-memory array.
+
+    """
+
+    def __init__(self, capacity = 4096):
+
+        """
+        Creates a simulated backend with all pins LOW.
+
+        Arguments:
+            "capacity": The initial number of commands the log can hold (it grows when full)
+
+        Returns:
+            None
+
+        """
+
+        self.commands = numpy.zeros(capacity, dtype = command_dtype)
+        self.command_count = 0
+
+        self.levels = {} # Current level of every claimed pin
+        self.duty_cycles = {} # Current PWM duty cycle of every pin
+        self.groups = {} # Pins of every claimed group, by their first pin
+
+    def record(self, command, pin, value):
+
+        """
+        Appends one command to the log.
+
+        Arguments:
+            "command": The command code
+            "pin": The pin (the first pin for group commands)
+            "value": The level, bits or duty cycle
+
+        Returns:
+            None
+
+        """
+
+        if self.command_count == len(self.commands): # Doubles the log when it is full
+            self.commands = numpy.concatenate((self.commands, numpy.zeros(len(self.commands), dtype = command_dtype)))
+
+        self.commands[self.command_count] = (time.monotonic(), command, pin, value)
+        self.command_count += 1
+
+    def claim_output(self, pin, level = 0):
+
+        if pin in self.levels:
+            raise GPIOBusyError("GPIO busy")
+
+        self.levels[pin] = level
+        self.record(COMMAND_CLAIM, pin, level)
+
+    def group_claim_output(self, pins, levels):
+
+        if any(pin in self.levels for pin in pins):
+            raise GPIOBusyError("GPIO busy")
+
+        self.groups[pins[0]] = list(pins)
+
+        for pin, level in zip(pins, levels):
+            self.levels[pin] = level
+            self.record(COMMAND_CLAIM, pin, level)
+
+    def free(self, pin):
+        self.levels.pop(pin, None)
+        self.record(COMMAND_FREE, pin, 0)
+
+    def write(self, pin, level):
+        self.levels[pin] = level
+        self.duty_cycles.pop(pin, None) # Writing a pin stops its PWM
+        self.record(COMMAND_WRITE, pin, level)
+
+    def group_write(self, leader_pin, bits, mask):
+
+        for index, pin in enumerate(self.groups[leader_pin]):
+            if mask & (1 << index):
+                self.levels[pin] = (bits >> index) & 1
+
+        self.record(COMMAND_GROUP_WRITE, leader_pin, bits)
+
+    def pwm(self, pin, frequency, duty_cycle):
+        self.duty_cycles[pin] = duty_cycle
+        self.record(COMMAND_PWM, pin, duty_cycle)
+        return 0
+
+    def close(self):
+        pass
+
+    def get_commands(self):
+
+        """
+        Gets the recorded commands.
+
+        Arguments:
+            None
+
+        Returns:
+            "commands": A structured array with the fields "time", "command", "pin" and "value"
+
+        """
+
+        return self.commands[:self.command_count]
+
+    def clear(self):
+
+        """
+        Forgets the recorded commands (the pin states are kept).
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        self.command_count = 0
@@ -0,0 +1,219 @@
+
+# --- Imports ---
+
+import bisect
+import json
+import signal
+import time
+
+# --- General definitions ---
+
+STAGES = ("capture", "parse", "tracking", "decision", "motor") # In pipeline order: every stage is timed from the sensor timestamp of the frame
+
+bucket_edges = [0.0001 * 2 ** (index / 4) for index in range(68)] # Upper edges (in seconds) from 0.1 ms to ~13 s, four buckets per doubling
+
+# --- Histograms ---
+
+class LatencyHistogram:
+
+    """
+    Counts latencies in fixed logarithmic buckets, so recording is constant time and never allocates.
+
+    """
+
+    def __init__(self):
+
+        """
+        Creates an empty histogram.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        self.counts = [0] * (len(bucket_edges) + 1) # The last bucket holds everything above the last edge
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, latency):
+
+        """
+        Adds one latency.
+
+        Arguments:
+            "latency": The latency (in seconds)
+
+        Returns:
+            None
+
+        """
+
+        self.counts[bisect.bisect_left(bucket_edges, latency)] += 1
+        self.count += 1
+        self.total += latency
+        self.maximum = max(self.maximum, latency)
+
+    def get_percentile(self, percentile):
+
+        """
+        Estimates a percentile from the buckets (the upper edge of the bucket it falls into).
+
+        Arguments:
+            "percentile": The percentile (0 to 100)
+
+        Returns:
+            "latency": The estimated latency (in seconds), or None if nothing has been recorded
+
+        """
+
+        if not self.count:
+            return None
+
+        rank = percentile / 100 * self.count
+        cumulative = 0
+
+        for index, bucket_count in enumerate(self.counts):
+
+            cumulative += bucket_count
+
+            if cumulative >= rank and bucket_count:
+                return min(bucket_edges[index], self.maximum) if index < len(bucket_edges) else self.maximum
+
+        return self.maximum
+
+histograms = {stage: LatencyHistogram() for stage in STAGES}
+
+# --- Recording ---
+
+def get_sensor_time(metadata, fallback):
+
+    """
+    Gets the time at which the sensor captured a frame, on the clock of "time.monotonic".
+
+    Arguments:
+        "metadata": The metadata dictionary from the camera
+        "fallback": The time to use when the metadata has no sensor timestamp (in seconds)
+
+    Returns:
+        "sensor_time": The sensor time (in seconds)
+
+    """
+
+    if "ReplayTimestamp" in metadata: # A recorded sensor timestamp belongs to another run
+        return fallback
+
+    sensor_timestamp = metadata.get("SensorTimestamp") # libcamera stamps frames in nanoseconds on the monotonic clock
+
+    if sensor_timestamp is None:
+        return fallback
+
+    return sensor_timestamp / 1e9
+
+def mark(stage, sensor_time):
+
+    """
+    Records how long after the sensor captured a frame it reached "stage".
+
+    Arguments:
+        "stage": One of STAGES
+        "sensor_time": The sensor time of the frame (in seconds), ignored if None
+
+    Returns:
+        None
+
+    """
+
+    if sensor_time is not None:
+        histograms[stage].record(time.monotonic() - sensor_time)
+
+# --- Reporting ---
+
+def dump():
+
+    """
+    Summarizes every stage: the latency since the sensor timestamp, and how much of it the stage itself added.
+
+    Arguments:
+        None
+
+    Returns:
+        "report": A dictionary per stage with the count, mean, p50, p90, p99 and maximum (in milliseconds), and the mean added by the stage
+
+    """
+
+    report = {}
+    previous_mean = 0.0
+
+    for stage in STAGES:
+
+        histogram = histograms[stage]
+
+        if not histogram.count:
+            report[stage] = {"count": 0}
+            continue
+
+        mean = histogram.total / histogram.count
+
+        report[stage] = {
+            "count": histogram.count,
+            "mean_ms": round(mean * 1000, 3),
+            "added_ms": round((mean - previous_mean) * 1000, 3), # Stages see different frame counts (e.g. skipped frames), so this is approximate
+            "p50_ms": round(histogram.get_percentile(50) * 1000, 3),
+            "p90_ms": round(histogram.get_percentile(90) * 1000, 3),
+            "p99_ms": round(histogram.get_percentile(99) * 1000, 3),
+            "max_ms": round(histogram.maximum * 1000, 3)
+        }
+
+        previous_mean = mean
+
+    return report
+
+def print_report(*_):
+
+    """
+    Prints the latency report (also usable as a signal handler).
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    """
+
+    print(f"\nLatency since sensor timestamp: {json.dumps(dump(), indent = 2)}")
+
+def reset():
+
+    """
+    Forgets every recorded latency.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    """
+
+    for stage in STAGES:
+        histograms[stage] = LatencyHistogram()
+
+def install_dump_signal(signal_number = signal.SIGUSR1):
+
+    """
+    Prints the latency report whenever the process receives "signal_number" (e.g. "kill -USR1 <pid>").
+
+    Arguments:
+        "signal_number": The signal
+
+    Returns:
+        None
+
+    """
+
+    signal.signal(signal_number, print_report)
@@ -0,0 +1,119 @@
+
+# --- Imports ---
+
+import time
+
+# --- General definitions ---
+
+default_loop_rate = 30 # Loop rate (in Hz) used when the network doesn't report an inference rate
+report_interval = 10.0 # Time between printed loop timing reports (in seconds)
+
+# --- Deadline accounting ---
+
+class CycleMonitor:
+
+    """
+    Keeps track of a control loop that runs once per camera frame: how late its outputs are and how many frames it missed.
+
+    """
+
+    def __init__(self, rate):
+
+        """
+        Creates a monitor for a loop running at "rate".
+
+        Arguments:
+            "rate": The expected loop rate (in Hz), normally the inference rate of the network
+
+        Returns:
+            None
+
+        """
+
+        self.rate = rate or default_loop_rate
+        self.period = 1 / self.rate
+
+        self.cycles = 0 # Frames the loop acted on
+        self.skipped_frames = 0 # Frames published while the loop was busy, so it never saw them
+        self.overruns = 0 # Cycles that finished after the next frame was due
+        self.timeouts = 0 # Waits that ended without a new frame
+
+        self.latency_total = 0.0 # Sum of the frame-to-actuation latencies (in seconds)
+        self.latency_maximum = 0.0
+
+        self.last_sequence = None
+        self.last_report_time = time.monotonic()
+
+    def frame_received(self, sequence):
+
+        """
+        Counts the frames that were skipped before this one.
+
+        Arguments:
+            "sequence": The sequence number of the frame the loop is about to act on, or None if the wait timed out (0 if nothing has been captured yet)
+
+        Returns:
+            "fresh": True if this is a new frame, False if the wait timed out
+
+        """
+
+        if not sequence or sequence == self.last_sequence: # Nothing captured yet counts as a timeout too
+            self.timeouts += 1
+            return False
+
+        if self.last_sequence is not None and sequence > self.last_sequence + 1:
+            self.skipped_frames += sequence - self.last_sequence - 1
+
+        self.last_sequence = sequence
+
+        return True
+
+    def cycle_finished(self, frame_timestamp):
+
+        """
+        Records the latency of a cycle, once its output has been applied.
+
+        Arguments:
+            "frame_timestamp": The capture time of the frame the cycle acted on (monotonic, in seconds)
+
+        Returns:
+            None
+
+        """
+
+        latency = time.monotonic() - frame_timestamp
+
+        self.cycles += 1
+        self.latency_total += latency
+        self.latency_maximum = max(self.latency_maximum, latency)
+
+        if latency > self.period: # The next frame was already due before this one was acted on
+            self.overruns += 1
+
+        if time.monotonic() - self.last_report_time >= report_interval:
+            self.last_report_time = time.monotonic()
+            print(f"\nLoop timing: {self.get_stats()}")
+
+    def get_stats(self):
+
+        """
+        Gets the loop timing counters.
+
+        Arguments:
+            None
+
+        Returns:
+            "stats": A dictionary with the cycle, missed cycle and timeout counts and the latencies (in milliseconds)
+
+        """
+
+        return {
+            "rate": self.rate,
+            "cycles": self.cycles,
+            "missed_cycles": self.skipped_frames + self.overruns,
+            "skipped_frames": self.skipped_frames,
+            "overruns": self.overruns,
+            "timeouts": self.timeouts,
+            "average_latency_ms": round(self.latency_total / self.cycles * 1000, 2) if self.cycles else None,
+            "maximum_latency_ms": round(self.latency_maximum * 1000, 2)
+        }
@@ -1,11 +1,15 @@
 
 # --- Imports ---
 
-import time
 import cv2
 import speaker
 import object_detection
-from motor_controller import forward, backwards, tank_turn_counterclockwise, tank_turn_clockwise, stop, disable_motors
+import latency_trace
+import telemetry
+from announcer import Announcer
+from follow_controller import FollowController
+from loop_timing import CycleMonitor
+from motor_controller import stop, set_velocity, disable_motors, start_output_thread, stop_output_thread, start_watchdog, stop_watchdog, get_watchdog_stats
 
 import sys
 import termios
@@ -17,7 +21,21 @@ import threading
 target_minimum_area = 0.35
 target_maximum_area = 0.5
 
-follow_loop_update_time = 0.1
+frame_timeout_periods = 5 # Frames the loop waits for before treating the camera as stalled and stopping
+
+area_announcement_step = 0.05 # The person area is only announced again when it changed by this much
+
+status_messages = [ # Every status "follow_step" can announce, rendered into the speaker's phrase cache at startup
+    "Trying to avoid an obstacle...",
+    "No person detected, waiting...",
+    "Person is too far away, trying to move forward...",
+    "Person is too close, moving backwards...",
+    "Turning right...",
+    "Turning left...",
+    "Distance is OK, stopping..."
+]
+
+status_priorities = {"Trying to avoid an obstacle...": speaker.PRIORITY_HIGH} # Safety warnings cut off whatever is being said
 
 # --- Key listener setup ---
 
@@ -41,94 +59,198 @@ def key_listener():
     finally:
         termios.tcsetattr(fd, termios.TCSADRAIN, old)
 
-# Start the listener thread
-threading.Thread(target=key_listener, daemon=True).start()
-
 # --- Helper functions ---
 
-def print_and_say(message):
+def print_and_say(message, priority = speaker.PRIORITY_NORMAL):
 
     """
-    Prints a message, writes it to a log file and says it aloud.
+    Prints a message (if console output is enabled), shows it in the video and says it aloud.
 
     Arguments:
         "message":
+        "priority": The speech priority, a higher one cuts off what is being said
 
     Returns:
         None
     
     """
 
-    print("\n" + message)
+    telemetry.console("\n" + message)
+
+    object_detection.set_video_status_text(message) # Update the video status text in the AI detection module
+
+    speaker.say_async(message, priority)
+
+def show_status(message):
+    object_detection.set_video_status_text(message) # Update the video status text in the AI detection module
+
+announcer = Announcer(print_and_say, show_status) # Only speaks when the state changes, so the speaker isn't flooded every frame
 
-    object_detection.video_status_text = message # Update the video status text in the AI detection module
+def announce(status, person_area):
+
+    """
+    Announces the state of the robot and the size of the person, if they changed enough to be worth saying.
+
+    Arguments:
+        "status": The message describing the state, or None if there is nothing new
+        "person_area": The normalized area of the person, or None
+
+    Returns:
+        None
 
-    speaker.say_async(message)
+    """
+
+    if status is None:
+        return
+
+    announcer.announce(status, status_priorities.get(status, speaker.PRIORITY_NORMAL))
+
+    if person_area is not None:
+        announcer.announce_value("person_area", "Person takes up {:.2f} of the total frame size", person_area, area_announcement_step, speaker.PRIORITY_LOW)
     
 # --- Main program loop ---
 
-def follow():
+def record_telemetry(direction, bias, speed, obstacle, person_in_front, measurement, linear, angular):
 
     """
-    Runs the person-following loop.
+    Writes one telemetry record for the frame last read by "get_tracking_data".
 
     Arguments:
+        "direction", "bias", "speed", "obstacle", "person_in_front": As returned by "get_tracking_data"
+        "measurement": The target measurement from "get_target_measurement", or None
+        "linear": The commanded linear speed (in %)
+        "angular": The commanded angular speed (in %)
+
+    Returns:
         None
 
+    """
+
+    flags = (telemetry.FLAG_PERSON if measurement is not None else 0) | (telemetry.FLAG_OBSTACLE if obstacle else 0) | (telemetry.FLAG_PERSON_IN_FRONT if person_in_front else 0)
+    _, x_center, area = measurement if measurement is not None else (None, None, None)
+
+    telemetry.record(object_detection.tracked_timestamp, object_detection.tracked_sequence, direction, flags, area, x_center, speed, bias, linear, angular)
+
+def follow_step(controller, monitor, wait_for_new_frame = True, timeout = 1.0):
+
+    """
+    Runs one cycle of the person-following loop: reads a frame, commands the motors and decides what to announce.
+
+    Arguments:
+        "controller": The follow controller turning the person's position into wheel speeds
+        "monitor": The cycle monitor accounting for missed frames and latency
+        "wait_for_new_frame": If True, blocks until the camera publishes the next frame
+        "timeout": The maximum time to wait for that frame (in seconds)
+
+    Returns:
+        "status": The message describing the state the robot is in, or None if the camera stalled
+        "person_area": The normalized area of the person, or None
+
+    """
+
+    direction, bias, speed, obstacle, person_area, person_in_front = object_detection.get_tracking_data(wait_for_new_frame = wait_for_new_frame, timeout = timeout) # Gets necessary data from the AI camera
+
+    if not monitor.frame_received(object_detection.tracked_sequence): # If the camera stalled:
+        set_velocity(0)
+        return None, None
+
+    sensor_time = object_detection.tracked_sensor_time
+
+    if obstacle and person_area is not None and not person_in_front:  #If the AI camera detects an obstacle and ses obstacle in front of person:
+        latency_trace.mark("decision", sensor_time)
+        stop()
+        latency_trace.mark("motor", sensor_time)
+        controller.reset()
+        monitor.cycle_finished(object_detection.tracked_timestamp)
+        record_telemetry(direction, bias, speed, obstacle, person_in_front, object_detection.get_target_measurement(), 0, 0)
+        return "Trying to avoid an obstacle...", person_area
+
+    measurement = object_detection.get_target_measurement()
+
+    if measurement is None:
+        latency_trace.mark("decision", sensor_time)
+        set_velocity(0, trace_time = sensor_time) # Ramps down, only obstacles need a hard stop
+        controller.reset() # The loops start fresh when the person is found again
+        monitor.cycle_finished(object_detection.tracked_timestamp)
+        record_telemetry(direction, bias, speed, obstacle, person_in_front, None, 0, 0)
+        return "No person detected, waiting...", None
+
+    timestamp, x_center, person_area = measurement
+
+    linear, angular = controller.update(person_area, x_center, timestamp) # Integrates over the time between frames, not loop iterations
+    latency_trace.mark("decision", sensor_time)
+    set_velocity(linear, angular, trace_time = sensor_time)
+    monitor.cycle_finished(timestamp) # Announcements come after the motors have their command
+    record_telemetry(direction, bias, speed, obstacle, person_in_front, measurement, linear, angular)
+
+    if controller.distance.band > 0: # The status follows the tolerance bands, not the sign of a noisy controller output
+        status = "Person is too far away, trying to move forward..."
+
+    elif controller.distance.band < 0:
+        status = "Person is too close, moving backwards..."
+
+    elif controller.heading.band > 0:
+        status = "Turning right..."
+
+    elif controller.heading.band < 0:
+        status = "Turning left..."
+
+    else:
+        status = "Distance is OK, stopping..."
+
+    return status, person_area
+
+def follow(controller, monitor):
+
+    """
+    Runs the person-following loop, once per camera frame.
+
+    Arguments:
+        "controller": The follow controller turning the person's position into wheel speeds
+        "monitor": The cycle monitor accounting for missed frames and latency
+
     Returns:
         None
     
     """
 
-    global stop_flag
-    while not stop_flag:
+    frame_timeout = frame_timeout_periods * monitor.period
 
-        direction, bias, speed, obstacle, person_area, person_in_front = object_detection.get_tracking_data() # Gets necessary data from the AI camera
-
-        if obstacle and person_area is not None and not person_in_front:  #If the AI camera detects an obstacle and ses obstacle in front of person:
-            print_and_say("Trying to avoid an obstacle...")
-            stop()
-            continue
-            
-        if person_area is None:
-            print_and_say("No person detected, waiting...")
-            stop()
-            continue
-        
-        print_and_say(f"Person takes up {person_area:.2f} of the total frame size")
-
-        if person_area < target_minimum_area:
-            
-            print_and_say("Person is too far away, trying to move forward...")
-            forward(direction, speed, bias)
-            
-        elif person_area > target_maximum_area:
-            print_and_say("Person is too close, moving backwards...")
-            backwards(direction, speed, bias)
-        else:
-        
-            if direction == "right":
-                tank_turn_clockwise(50, bias)
-                print_and_say("Turning right...")
-
-            elif direction == "left":
-                tank_turn_counterclockwise(50, bias)
-                print_and_say("Turning left...")
-
-            else:
-                stop()
-                print_and_say("Distance is OK, stopping...")
-
-        time.sleep(follow_loop_update_time)
+    while not stop_flag:
+        announce(*follow_step(controller, monitor, timeout = frame_timeout)) # Blocks until the camera publishes the next frame, which paces the loop
 
 # --- Execution ---
 if __name__ == "__main__":
+    arguments = object_detection.get_arguments()
+    telemetry.console_enabled = arguments.verbose
+    if arguments.telemetry:
+        telemetry.open_log(arguments.telemetry)
+    if arguments.speech_process:
+        speaker.use_process() # Must happen before anything is said
+    perception = object_detection.PerceptionSession.from_arguments(arguments).start() # Loads the model and starts the camera
+    controller = FollowController(target_minimum_area, target_maximum_area, arguments.follow_log)
+    monitor = CycleMonitor(object_detection.intrinsics.inference_rate) # The loop runs once per inference result
+    start_output_thread() # From here on, the movement functions only set target wheel speeds
+    start_watchdog() # Stops the wheels if the loop stops sending commands (e.g. hangs on the camera)
+    threading.Thread(target=key_listener, daemon=True).start() # Start the listener thread
+    latency_trace.install_dump_signal() # "kill -USR1 <pid>" prints the latency histograms
+    speaker.prerender(status_messages) # Rendered while the speaker is idle, so they play back without synthesis
     try:
-        follow()
+        follow(controller, monitor)
     except KeyboardInterrupt:
         print("\nKeyboardInterrupt detected.")
         stop()
         speaker.stop_tts(graceful=True)
     finally:
+        perception.stop()
+        controller.close()
+        stop_watchdog()
+        stop_output_thread()
+        stop()
         disable_motors()
+        print(f"\nMotor watchdog: {get_watchdog_stats()}")
+        print(f"\nLoop timing: {monitor.get_stats()}")
+        print(f"\nAnnouncements: {announcer.get_stats()} | Speech: {speaker.get_speech_stats()}")
+        latency_trace.print_report()
+        telemetry.close_log()
         print("\nbye bye")
@@ -1,8 +1,12 @@
 
 # --- Imports ---
 
-import lgpio
+import os
 import time
+import threading
+import latency_trace
+import telemetry
+from gpio_backend import LgpioBackend, SimulatedBackend, GPIOBusyError, COMMAND_NAMES
 
 # --- Definitions ---
 
@@ -24,34 +28,193 @@ RIGHT_MOTOR_INPUT_PIN_4 = 22
 
 MOTOR_INPUT_PINS = [LEFT_MOTOR_INPUT_PIN_1, LEFT_MOTOR_INPUT_PIN_2, RIGHT_MOTOR_INPUT_PIN_3, RIGHT_MOTOR_INPUT_PIN_4]
 
-ALL_PINS = [LEFT_MOTOR_ENABLING_PIN, RIGHT_MOTOR_ENABLING_PIN] + MOTOR_INPUT_PINS
+MOTOR_ENABLING_PINS = [LEFT_MOTOR_ENABLING_PIN, RIGHT_MOTOR_ENABLING_PIN]
+
+ALL_PINS = MOTOR_ENABLING_PINS + MOTOR_INPUT_PINS
+
+# Direction bits of the input pin group (bit i is MOTOR_INPUT_PINS[i])
+
+LEFT_MOTOR_FORWARD_BITS = 0b0001 # Pin 1 HIGH, pin 2 LOW
+LEFT_MOTOR_BACKWARDS_BITS = 0b0010 # Pin 1 LOW, pin 2 HIGH
+LEFT_MOTOR_MASK = 0b0011
+
+RIGHT_MOTOR_FORWARD_BITS = 0b1000 # Pin 3 LOW, pin 4 HIGH (inverted)
+RIGHT_MOTOR_BACKWARDS_BITS = 0b0100 # Pin 3 HIGH, pin 4 LOW
+RIGHT_MOTOR_MASK = 0b1100
+
+ALL_MOTORS_MASK = LEFT_MOTOR_MASK | RIGHT_MOTOR_MASK
 
 PWM_FREQUENCY = 1000 # Frequency for PWM instances (in Hz)
 
+MINIMUM_DUTY_CYCLE = 30 # Lowest duty cycle (in %) at which the wheels still turn
+MAXIMUM_DUTY_CYCLE = 100
+STOPPED_DUTY_CYCLE = 1 # Wheel speeds (in %) below this are treated as stopped
+
+MOTOR_UPDATE_RATE = 100 # Rate of the motor output thread (in Hz)
+MOTOR_ACCELERATION_LIMIT = 400 # Maximum change of a wheel speed (in % per second) while the output thread runs
+
+COMMAND_DEADLINE = 1.2 # Time without a fresh command (in seconds) after which the watchdog stops the wheels (longer than the longest timed move in obstacle_avoidance)
+WATCHDOG_STOP_LATENCY = 0.02 # Budget (in seconds) between the deadline and the stop, fires later than this are counted as late
+
+# --- Motor state ---
+
+applied_duty_cycles = {LEFT_MOTOR_ENABLING_PIN: None, RIGHT_MOTOR_ENABLING_PIN: None} # Last duty cycle applied to every enabling pin (None = unknown)
+applied_direction_bits = None # Last levels written to the input pin group (None = unknown)
+
+writes_issued = 0 # GPIO/PWM calls that actually reached the backend
+writes_suppressed = 0 # Calls skipped because the pin already was in the requested state
+
 # --- Setup ---
 
-CHIP_HANDLE = lgpio.gpiochip_open(0)
+backend = None # The GPIO backend, set up on first use (or explicitly with "setup")
+
+def claim(claim_function, pins):
+
+    """
+    Claims pins as outputs, freeing them first if they are busy.
+
+    Arguments:
+        "claim_function": A function claiming the pins
+        "pins": The pins it claims
+
+    Returns:
+        None
+
+    """
 
-for pin in ALL_PINS:
-    
     try:
-        lgpio.gpio_claim_output(CHIP_HANDLE, pin, 0)
-        
-    except lgpio.error as e:
-        
-        if str(e) == "GPIO busy":
-            print(f"Pin {pin} busy — trying to free it.")
-            lgpio.gpio_clear(CHIP_HANDLE, pin)
-            lgpio.gpio_claim_output(CHIP_HANDLE, pin, 0)
-            
-        else:
-            raise
+        claim_function()
+
+    except GPIOBusyError:
+        print(f"Pins {pins} busy — trying to free them.")
+        for pin in pins:
+            backend.free(pin)
+        claim_function()
+
+def setup(gpio_backend = None):
+
+    """
+    Claims the motor pins and starts the PWM on the enabling pins.
+
+    Arguments:
+        "gpio_backend": The GPIO backend to use. Defaults to the real lgpio pins, or to a simulated backend if the
+                        environment variable GPIO_BACKEND is "simulated"
+
+    Returns:
+        "backend": The backend in use
+
+    """
 
-for pin in [LEFT_MOTOR_ENABLING_PIN, RIGHT_MOTOR_ENABLING_PIN]:
-    lgpio.gpio_write(CHIP_HANDLE, pin, 1) # Enables the motors by setting their enabling pins HIGH
+    global backend, applied_direction_bits
+
+    if gpio_backend is None:
+        gpio_backend = SimulatedBackend() if os.environ.get("GPIO_BACKEND") == "simulated" else LgpioBackend()
+
+    backend = gpio_backend
+
+    for pin in MOTOR_ENABLING_PINS:
+        claim(lambda: backend.claim_output(pin, 0), [pin])
+
+    claim(lambda: backend.group_claim_output(MOTOR_INPUT_PINS, [0] * len(MOTOR_INPUT_PINS)), MOTOR_INPUT_PINS) # The input pins are claimed as one group, so a direction change is a single atomic write
+
+    applied_direction_bits = 0 # Every input pin was claimed LOW
+
+    for pin in MOTOR_ENABLING_PINS:
+        backend.write(pin, 1) # Enables the motors by setting their enabling pins HIGH
+
+    for pin in MOTOR_ENABLING_PINS:
+        backend.pwm(pin, PWM_FREQUENCY, 0) # Creates a PWM instance on every enabling pin with the defined frequency and a duty cycle of 0 %
+        applied_duty_cycles[pin] = 0
+
+    return backend
+
+def get_backend():
+
+    """
+    Gets the GPIO backend, setting it up on first use.
 
-PWM_LEFT_MOTOR = lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, 0) # Creates a PWM instance on the left motor enabling pin with the defined frequency and a duty cycle of 0 %
-PWM_RIGHT_MOTOR = lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, 0) # Creates a PWM instance on the right motor enabling pin with the defined frequency and a duty cycle of 0 %
+    Arguments:
+        None
+
+    Returns:
+        "backend": The backend in use
+
+    """
+
+    if backend is None:
+        setup()
+
+    return backend
+
+# --- Cached GPIO writes ---
+
+def set_duty_cycle(pin, duty_cycle):
+
+    """
+    Sets the PWM duty cycle of an enabling pin, unless it already has that duty cycle.
+
+    Restarting the PWM waveform with the same duty cycle costs a syscall and can glitch the motor, so it is skipped.
+
+    Arguments:
+        "pin": The enabling pin
+        "duty_cycle": The duty cycle (in %)
+
+    Returns:
+        None
+
+    """
+
+    global writes_issued, writes_suppressed
+
+    if applied_duty_cycles[pin] == duty_cycle:
+        writes_suppressed += 1
+        return
+
+    get_backend().pwm(pin, PWM_FREQUENCY, duty_cycle)
+    applied_duty_cycles[pin] = duty_cycle
+    writes_issued += 1
+
+def write_direction_bits(bits, mask = ALL_MOTORS_MASK):
+
+    """
+    Writes the direction bits of the input pin group in one atomic group write, unless they already have those levels.
+
+    Arguments:
+        "bits": The levels of the input pins (bit i is MOTOR_INPUT_PINS[i])
+        "mask": Which of the bits to change, the others keep their levels
+
+    Returns:
+        None
+
+    """
+
+    global applied_direction_bits, writes_issued, writes_suppressed
+
+    new_bits = ((applied_direction_bits or 0) & ~mask) | (bits & mask)
+
+    if applied_direction_bits == new_bits:
+        writes_suppressed += 1
+        return
+
+    get_backend().group_write(MOTOR_INPUT_PINS[0], new_bits, ALL_MOTORS_MASK) # The group is addressed by its first pin; all four levels change at once
+    applied_direction_bits = new_bits
+    writes_issued += 1
+
+def get_write_counts():
+
+    """
+    Gets how many GPIO/PWM writes were issued and how many were suppressed as redundant.
+
+    Arguments:
+        None
+
+    Returns:
+        "writes_issued": The number of writes that reached the backend
+        "writes_suppressed": The number of writes that were skipped
+
+    """
+
+    return writes_issued, writes_suppressed
 
 # --- Motor controlling functions ---
 
@@ -70,8 +233,7 @@ def left_motor_forward():
 
     """
 
-    lgpio.gpio_write(CHIP_HANDLE, LEFT_MOTOR_INPUT_PIN_1, 1)
-    lgpio.gpio_write(CHIP_HANDLE, LEFT_MOTOR_INPUT_PIN_2, 0)
+    write_direction_bits(LEFT_MOTOR_FORWARD_BITS, LEFT_MOTOR_MASK)
 
 def left_motor_backwards():
 
@@ -86,8 +248,7 @@ def left_motor_backwards():
     
     """
 
-    lgpio.gpio_write(CHIP_HANDLE, LEFT_MOTOR_INPUT_PIN_1, 0)
-    lgpio.gpio_write(CHIP_HANDLE, LEFT_MOTOR_INPUT_PIN_2, 1)
+    write_direction_bits(LEFT_MOTOR_BACKWARDS_BITS, LEFT_MOTOR_MASK)
 
 # Right motor (inverted)
 
@@ -104,8 +265,7 @@ def right_motor_forward():
 
     """
 
-    lgpio.gpio_write(CHIP_HANDLE, RIGHT_MOTOR_INPUT_PIN_3, 0)
-    lgpio.gpio_write(CHIP_HANDLE, RIGHT_MOTOR_INPUT_PIN_4, 1)
+    write_direction_bits(RIGHT_MOTOR_FORWARD_BITS, RIGHT_MOTOR_MASK)
 
 def right_motor_backwards():
 
@@ -120,13 +280,12 @@ def right_motor_backwards():
     
     """
 
-    lgpio.gpio_write(CHIP_HANDLE, RIGHT_MOTOR_INPUT_PIN_3, 1)
-    lgpio.gpio_write(CHIP_HANDLE, RIGHT_MOTOR_INPUT_PIN_4, 0)
+    write_direction_bits(RIGHT_MOTOR_BACKWARDS_BITS, RIGHT_MOTOR_MASK)
 
 def stop():
 
     """
-    Makes both motors stop.
+    Makes both motors stop right away, without ramping down (the output thread, if running, continues from standstill).
 
     Arguments:
         None
@@ -136,82 +295,246 @@ def stop():
     
     """
 
-    for pin in MOTOR_INPUT_PINS:
-        lgpio.gpio_write(CHIP_HANDLE, pin, 0)
+    record_command()
+    stop_motors_now()
+
+def stop_motors_now():
+
+    """
+    Same as "stop", without counting as a fresh command (used by the watchdog).
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    """
+
+    global target_wheel_speeds
+
+    with motor_lock:
+        target_wheel_speeds = (0.0, 0.0)
+        output_wheel_speeds[:] = [0.0, 0.0]
+        write_direction_bits(0) # All input pins LOW
 
 # --- Movement functions ---
 
-def forward(direction = "centered", speed = 100, bias = 0.5):
+def mix_wheel_speeds(linear, angular):
+
+    """
+    Maps a linear and an angular velocity onto signed speeds for the two wheels.
+
+    Saturation keeps the ratio between the wheels, so the curve stays the same when it is too fast.
+
+    Arguments:
+        "linear": The forward speed (in % of full speed, negative = backwards)
+        "angular": The turning speed (in % of full speed, positive = clockwise)
+
+    Returns:
+        "left_speed": The signed speed of the left wheel (in %)
+        "right_speed": The signed speed of the right wheel (in %)
+
+    """
+
+    left_speed = linear + angular
+    right_speed = linear - angular
+
+    saturation = max(abs(left_speed), abs(right_speed), MAXIMUM_DUTY_CYCLE) / MAXIMUM_DUTY_CYCLE # Above 1 only if a wheel would go faster than possible
+
+    return left_speed / saturation, right_speed / saturation
+
+def compensate_deadband(speed):
+
+    """
+    Turns a signed wheel speed into a signed duty cycle, raising speeds below MINIMUM_DUTY_CYCLE to it, since the motors stall below that.
+
+    Arguments:
+        "speed": The signed wheel speed (in %)
+
+    Returns:
+        "duty_cycle": The signed duty cycle (in %)
+
+    """
+
+    magnitude = abs(speed)
+
+    if magnitude < STOPPED_DUTY_CYCLE: # Too small to mean anything, the wheel stops
+        magnitude = 0
+
+    elif magnitude < MINIMUM_DUTY_CYCLE: # Deadband compensation
+        magnitude = MINIMUM_DUTY_CYCLE
+
+    return round(magnitude if speed >= 0 else -magnitude, 1) # Rounded, so tiny changes don't restart the PWM
+
+def get_wheel_duty_cycles(linear, angular):
+
+    """
+    Maps a linear and an angular velocity onto signed duty cycles for the two wheels, with saturation and deadband compensation.
+
+    Arguments:
+        "linear": The forward speed (in % of full speed, negative = backwards)
+        "angular": The turning speed (in % of full speed, positive = clockwise)
+
+    Returns:
+        "left_duty_cycle": The signed duty cycle of the left wheel (in %)
+        "right_duty_cycle": The signed duty cycle of the right wheel (in %)
+
+    """
+
+    left_speed, right_speed = mix_wheel_speeds(linear, angular)
+
+    return compensate_deadband(left_speed), compensate_deadband(right_speed)
+
+def set_wheel_duty_cycles(left_duty_cycle, right_duty_cycle):
+
+    """
+    Applies signed duty cycles to the wheels: one group write for both directions, then the two duty cycles.
+
+    Arguments:
+        "left_duty_cycle": The signed duty cycle of the left wheel (in %)
+        "right_duty_cycle": The signed duty cycle of the right wheel (in %)
+
+    Returns:
+        None
+
+    """
+
+    record_command()
+
+    with motor_lock:
+        apply_wheel_duty_cycles(left_duty_cycle, right_duty_cycle)
+
+def apply_wheel_duty_cycles(left_duty_cycle, right_duty_cycle):
+
+    """
+    Same as "set_wheel_duty_cycles", for callers already holding "motor_lock".
+
+    Arguments:
+        "left_duty_cycle": The signed duty cycle of the left wheel (in %)
+        "right_duty_cycle": The signed duty cycle of the right wheel (in %)
+
+    Returns:
+        None
+
+    """
+
+    bits = 0
+
+    if left_duty_cycle > 0:
+        bits |= LEFT_MOTOR_FORWARD_BITS
+    elif left_duty_cycle < 0:
+        bits |= LEFT_MOTOR_BACKWARDS_BITS
+
+    if right_duty_cycle > 0:
+        bits |= RIGHT_MOTOR_FORWARD_BITS
+    elif right_duty_cycle < 0:
+        bits |= RIGHT_MOTOR_BACKWARDS_BITS
+
+    set_duty_cycle(LEFT_MOTOR_ENABLING_PIN, abs(left_duty_cycle))
+    set_duty_cycle(RIGHT_MOTOR_ENABLING_PIN, abs(right_duty_cycle))
+    write_direction_bits(bits)
+
+def set_velocity(linear, angular = 0, trace_time = None):
+
+    """
+    Makes the robot drive with the given linear and angular velocity (e.g. a smooth arc when both are set).
+
+    While the motor output thread runs, this only sets the target and the thread ramps the wheels towards it.
+    Wheels commanded below MINIMUM_DUTY_CYCLE (but not stopped) run at MINIMUM_DUTY_CYCLE, since the motors stall below it.
+
+    Arguments:
+        "linear": The forward speed (in % of full speed, negative = backwards)
+        "angular": The turning speed (in % of full speed, positive = clockwise)
+        "trace_time": The sensor time of the frame this command is based on, to trace its latency up to the motor write
+
+    Returns:
+        None
+
+    """
+
+    global target_wheel_speeds, pending_trace_time
+
+    if output_thread is not None:
+        record_command()
+        target_wheel_speeds = mix_wheel_speeds(linear, angular) # A single assignment, picked up by the output thread
+        pending_trace_time = trace_time # Set after the target, so the thread never traces a target it hasn't seen
+        return
+
+    set_wheel_duty_cycles(*get_wheel_duty_cycles(linear, angular))
+    latency_trace.mark("motor", trace_time)
+
+def set_wheel_velocities(left_duty_cycle, right_duty_cycle):
 
     """
-    Makes the robot go forward.
+    Makes the robot drive with the given signed wheel speeds, through "set_velocity".
 
     Arguments:
+        "left_duty_cycle": The signed speed of the left wheel (in %)
+        "right_duty_cycle": The signed speed of the right wheel (in %)
+
+    Returns:
         None
+
+    """
+
+    set_velocity((left_duty_cycle + right_duty_cycle) / 2, (left_duty_cycle - right_duty_cycle) / 2)
+
+def forward(direction = "centered", speed = 100, bias = 0.5):
+
+    """
+    Makes the robot go forward, slowing down the wheel on the side of "direction" by "bias".
+
+    Arguments:
+        "direction": "right", "left" or "centered"
+        "speed": The speed of the faster wheel (in %), wheels below MINIMUM_DUTY_CYCLE (30 %) run at it
+        "bias": The factor applied to the slower wheel
     
     Returns:
         None
     
     """
-    
-    if speed * bias < 30:
-        biased_speed = 30
 
-    else:
-        biased_speed = speed * bias
-    
-    print(f"\n bias is: {bias}")
+    telemetry.console(f"\n bias is: {bias}", "bias")
+
+    biased_speed = speed * bias
 
     if direction == "right":
-        lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, speed)
-        lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, biased_speed)
+        set_wheel_velocities(speed, biased_speed)
 
     elif direction == "left":
-        lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, biased_speed)
-        lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, speed)
+        set_wheel_velocities(biased_speed, speed)
 
     else:
-        lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, speed)
-        lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, speed)
-
-    left_motor_forward()
-    right_motor_forward()
+        set_wheel_velocities(speed, speed)
 
 def backwards(direction = "centered", speed = 100, bias = 0.5):
 
     """
-    Makes the robot go backwards.
+    Makes the robot go backwards, slowing down the wheel on the opposite side of "direction" by "bias".
 
     Arguments:
-        None
+        "direction": "right", "left" or "centered"
+        "speed": The speed of the faster wheel (in %), wheels below MINIMUM_DUTY_CYCLE (30 %) run at it
+        "bias": The factor applied to the slower wheel
     
     Returns:
         None
     
     """
 
-    print(f"\n bias is: {bias}")
+    telemetry.console(f"\n bias is: {bias}", "bias")
 
-    if speed * bias < 30:
-        biased_speed = 30
-
-    else:
-        biased_speed = speed * bias
+    biased_speed = speed * bias
 
     if direction == "right":
-        lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, biased_speed)
-        lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, speed)
+        set_wheel_velocities(-biased_speed, -speed)
     
     elif direction == "left":
-        lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, speed)
-        lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, biased_speed)
+        set_wheel_velocities(-speed, -biased_speed)
 
     else:
-        lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, speed)
-        lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, speed)
-
-    left_motor_backwards()
-    right_motor_backwards()
+        set_wheel_velocities(-speed, -speed)
 
 def tank_turn_counterclockwise(speed = 100, bias = 0.5):
 
@@ -219,23 +542,15 @@ def tank_turn_counterclockwise(speed = 100, bias = 0.5):
     Makes the robot tank turn counterclockwise.
 
     Arguments:
-        None
+        "speed": The turning speed (in %), wheels below MINIMUM_DUTY_CYCLE (30 %) run at it
+        "bias": The factor applied to the speed
     
     Returns:
         None
     
     """
 
-    if speed * bias < 30:
-        biased_speed = 30
-    else:
-        biased_speed = speed * bias
-
-    lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, biased_speed)
-    lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, biased_speed)
-
-    left_motor_backwards()
-    right_motor_forward()
+    set_velocity(0, -speed * bias)
 
 def tank_turn_clockwise(speed = 100, bias = 0.5):
 
@@ -243,22 +558,293 @@ def tank_turn_clockwise(speed = 100, bias = 0.5):
     Makes the robot tank turn clockwise.
 
     Arguments:
-        None
+        "speed": The turning speed (in %), wheels below MINIMUM_DUTY_CYCLE (30 %) run at it
+        "bias": The factor applied to the speed
     
     Returns:
         None
     
     """
-    if speed * bias < 30:
-        biased_speed = 30
-    else:
-        biased_speed = speed * bias
 
-    lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, biased_speed)
-    lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, biased_speed)
+    set_velocity(0, speed * bias)
+
+# --- Motor output thread ---
+
+motor_lock = threading.RLock() # Serializes hardware writes between the output thread and direct calls (e.g. "stop")
+
+target_wheel_speeds = (0.0, 0.0) # Signed wheel speeds (in %) the output thread ramps towards
+output_wheel_speeds = [0.0, 0.0] # Signed wheel speeds (in %) the output thread currently applies
+pending_trace_time = None # Sensor time of the frame behind the newest target, until the thread has applied it
+
+output_thread = None
+output_shutdown = threading.Event()
+
+def output_worker(rate, acceleration_limit):
+
+    """
+    Runs in a separate thread — ramps the wheel speeds towards their targets at a fixed rate, limited by the acceleration.
+
+    Arguments:
+        "rate": The update rate (in Hz)
+        "acceleration_limit": The maximum change of a wheel speed (in % per second)
+
+    Returns:
+        None
+
+    """
+
+    period = 1 / rate
+    maximum_step = acceleration_limit * period
+    next_update_time = time.monotonic()
+
+    global pending_trace_time
 
-    left_motor_forward()
-    right_motor_backwards()
+    while not output_shutdown.is_set():
+
+        trace_time = pending_trace_time # Read before the target, see "set_velocity"
+        targets = target_wheel_speeds
+
+        with motor_lock:
+
+            for wheel in range(2):
+                difference = targets[wheel] - output_wheel_speeds[wheel]
+                output_wheel_speeds[wheel] += max(-maximum_step, min(maximum_step, difference))
+
+            apply_wheel_duty_cycles(compensate_deadband(output_wheel_speeds[0]), compensate_deadband(output_wheel_speeds[1])) # Unchanged wheels are suppressed by the write cache
+
+        if trace_time is not None: # The first write towards a new target ends its latency trace
+            latency_trace.mark("motor", trace_time)
+            if pending_trace_time == trace_time:
+                pending_trace_time = None
+
+        next_update_time += period
+        delay = next_update_time - time.monotonic()
+
+        if delay > 0:
+            output_shutdown.wait(delay)
+        else:
+            next_update_time = time.monotonic() # Fell behind, so the schedule restarts instead of catching up in a burst
+
+def start_output_thread(rate = MOTOR_UPDATE_RATE, acceleration_limit = MOTOR_ACCELERATION_LIMIT):
+
+    """
+    Starts the motor output thread. From then on, "set_velocity" (and the movement functions) only set targets.
+
+    Arguments:
+        "rate": The update rate (in Hz)
+        "acceleration_limit": The maximum change of a wheel speed (in % per second)
+
+    Returns:
+        None
+
+    """
+
+    global output_thread, target_wheel_speeds
+
+    if output_thread is not None and output_thread.is_alive():
+        return
+
+    get_backend()
+
+    target_wheel_speeds = tuple(output_wheel_speeds)
+    output_shutdown.clear()
+    output_thread = threading.Thread(target = output_worker, args = (rate, acceleration_limit), daemon = True)
+    output_thread.start()
+
+def stop_output_thread(timeout = 1.0):
+
+    """
+    Stops the motor output thread. The wheels keep their last applied speeds.
+
+    Arguments:
+        "timeout": The maximum time to wait for the thread to finish (in seconds)
+
+    Returns:
+        None
+
+    """
+
+    global output_thread
+
+    output_shutdown.set()
+
+    if output_thread is not None:
+        output_thread.join(timeout = timeout)
+        output_thread = None
+
+# --- Command watchdog ---
+
+last_command_time = None # Monotonic time of the last movement command (None = no command yet)
+
+commands_received = 0
+command_interval_total = 0.0 # Sum of the times between consecutive commands (in seconds)
+command_interval_maximum = 0.0
+
+watchdog_fires = 0 # Times the watchdog had to stop the wheels
+watchdog_late_fires = 0 # Fires that stopped the wheels later than WATCHDOG_STOP_LATENCY after the deadline
+watchdog_latency_maximum = 0.0 # Longest time between a deadline and the stop (in seconds)
+
+watchdog_thread = None
+watchdog_shutdown = threading.Event()
+
+def record_command():
+
+    """
+    Marks that a fresh movement command arrived, which resets the watchdog deadline.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    """
+
+    global last_command_time, commands_received, command_interval_total, command_interval_maximum
+
+    now = time.monotonic()
+
+    if last_command_time is not None:
+        interval = now - last_command_time
+        command_interval_total += interval
+        command_interval_maximum = max(command_interval_maximum, interval)
+
+    last_command_time = now
+    commands_received += 1
+
+def is_moving():
+
+    """
+    Checks whether a wheel is (or is ramping to be) turning.
+
+    Arguments:
+        None
+
+    Returns:
+        "moving": True if a direction pin is HIGH or the output thread has a non-zero target
+
+    """
+
+    return bool(applied_direction_bits) or target_wheel_speeds != (0.0, 0.0)
+
+def watchdog_worker(deadline):
+
+    """
+    Runs in a separate thread — sleeps until the current command deadline and stops the wheels if no fresh command arrived by then.
+
+    Arguments:
+        "deadline": The maximum time between commands (in seconds)
+
+    Returns:
+        None
+
+    """
+
+    global watchdog_fires, watchdog_late_fires, watchdog_latency_maximum
+
+    while not watchdog_shutdown.is_set():
+
+        command_time = last_command_time
+
+        if command_time is None:
+            watchdog_shutdown.wait(deadline) # Any command arriving meanwhile is due at least as late as this wakeup
+            continue
+
+        delay = command_time + deadline - time.monotonic()
+
+        if delay > 0: # Wakes up right at the deadline, a newer command only pushes it further out
+            watchdog_shutdown.wait(delay)
+            continue
+
+        with motor_lock:
+
+            refreshed = last_command_time != command_time
+            moving = is_moving()
+
+            if not refreshed and moving:
+                stop_motors_now()
+
+        if refreshed:
+            continue
+
+        if not moving: # Already standing still, nothing to watch until the next command
+            watchdog_shutdown.wait(deadline)
+            continue
+
+        latency = time.monotonic() - (command_time + deadline)
+        watchdog_fires += 1
+        watchdog_latency_maximum = max(watchdog_latency_maximum, latency)
+
+        if latency > WATCHDOG_STOP_LATENCY:
+            watchdog_late_fires += 1
+
+        print(f"\nWatchdog: no motor command for {deadline:.2f} s, stopped the wheels (latency {latency * 1000:.1f} ms)")
+
+def start_watchdog(deadline = COMMAND_DEADLINE):
+
+    """
+    Starts the command watchdog. From then on, the wheels are stopped whenever no movement command arrives for "deadline" seconds.
+
+    Arguments:
+        "deadline": The maximum time between commands (in seconds)
+
+    Returns:
+        None
+
+    """
+
+    global watchdog_thread
+
+    if watchdog_thread is not None and watchdog_thread.is_alive():
+        return
+
+    watchdog_shutdown.clear()
+    watchdog_thread = threading.Thread(target = watchdog_worker, args = (deadline,), daemon = True)
+    watchdog_thread.start()
+
+def stop_watchdog(timeout = 1.0):
+
+    """
+    Stops the command watchdog.
+
+    Arguments:
+        "timeout": The maximum time to wait for the thread to finish (in seconds)
+
+    Returns:
+        None
+
+    """
+
+    global watchdog_thread
+
+    watchdog_shutdown.set()
+
+    if watchdog_thread is not None:
+        watchdog_thread.join(timeout = timeout)
+        watchdog_thread = None
+
+def get_watchdog_stats():
+
+    """
+    Gets how often the watchdog fired and how fresh the movement commands were.
+
+    Arguments:
+        None
+
+    Returns:
+        "stats": A dictionary with the fire counts, the worst stop latency and the command intervals (in seconds)
+
+    """
+
+    return {
+        "fires": watchdog_fires,
+        "late_fires": watchdog_late_fires,
+        "maximum_stop_latency": watchdog_latency_maximum,
+        "commands": commands_received,
+        "command_age": time.monotonic() - last_command_time if last_command_time is not None else None,
+        "average_command_interval": command_interval_total / (commands_received - 1) if commands_received > 1 else None,
+        "maximum_command_interval": command_interval_maximum
+    }
 
 # --- Miscellaneous functions ---
 
@@ -275,13 +861,14 @@ def disable_motors():
 
     """
 
-    for pin in [LEFT_MOTOR_ENABLING_PIN, RIGHT_MOTOR_ENABLING_PIN]:
-        lgpio.gpio_write(CHIP_HANDLE, pin, 0)
+    for pin in MOTOR_ENABLING_PINS:
+        get_backend().write(pin, 0)
+        applied_duty_cycles[pin] = None # Writing the pin stops its PWM, so its duty cycle is unknown now
 
 def cleanup():
 
     """
-    Cleans up by stopping the PWM instances and closing the GPIO chip handle.
+    Cleans up by stopping the PWM instances and closing the GPIO backend.
 
     Arguments:
         None
@@ -291,18 +878,27 @@ def cleanup():
 
     """
 
-    lgpio.tx_pwm(CHIP_HANDLE, LEFT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, 0)
-    lgpio.tx_pwm(CHIP_HANDLE, RIGHT_MOTOR_ENABLING_PIN, PWM_FREQUENCY, 0)
-    
-    lgpio.gpiochip_close(CHIP_HANDLE)
+    global backend
+
+    if backend is None:
+        return
+
+    for pin in MOTOR_ENABLING_PINS:
+        backend.pwm(pin, PWM_FREQUENCY, 0)
+        applied_duty_cycles[pin] = None
+
+    backend.close()
+    backend = None
 
 # --- Test ---
 
 if __name__ == "__main__":
 
-    try:
+    print("\nMotor controller test starting...")
 
-        print("\nMotor controller test starting...")
+    gpio_backend = setup() # Outside the "try", so a failed setup shows its own error instead of one from the cleanup
+
+    try:
 
         print("\nTrying to move forward...")
 
@@ -318,7 +914,7 @@ if __name__ == "__main__":
         time.sleep(0.5)
         stop()
         
-        forward("centered", 25, 1)
+        forward("centered", MINIMUM_DUTY_CYCLE, 1) # The slowest the wheels turn, lower speeds are raised to it
         time.sleep(0.5)
         stop()
 
@@ -336,7 +932,7 @@ if __name__ == "__main__":
         time.sleep(0.5)
         stop()
 
-        backwards("centered", 25, 1)
+        backwards("centered", MINIMUM_DUTY_CYCLE, 1) # The slowest the wheels turn, lower speeds are raised to it
         time.sleep(0.5)
         stop()
 
@@ -360,4 +956,9 @@ if __name__ == "__main__":
         stop()
         disable_motors()
         cleanup()
+        print(f"\nGPIO writes issued: {writes_issued} | suppressed: {writes_suppressed}")
+
+        if isinstance(gpio_backend, SimulatedBackend): # Prints the recorded commands when running off the Pi
+            for command in gpio_backend.get_commands():
+                print(f"{command['time']:.4f} {COMMAND_NAMES[int(command['command'])]:11s} pin {command['pin']} value {command['value']:g}")
         print("\nMotor controller test finished.\n")
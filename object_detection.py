@@ -2,27 +2,51 @@
 # --- Imports ---
 
 import time
+import threading # Imports the threading module, used to run the camera capture in the background
 import datetime # Imports the datetime module for working with dates and times
 import argparse # Imports the argparse module, which provides a way to parse command-line arguments
 from functools import lru_cache # Imports the lru_cache decorator from the functools module, which is used to cache the results of function calls
 import cv2 # Imports the OpenCV library for image and video processing
 import numpy # Imports the NumPy library for numerical operations on arrays
 
-import libcamera # Imports the libcamera module, which provides access to the camera framework
-from picamera2 import MappedArray, Picamera2 # Imports MappedArray and Picamera2 classes for handling camera data and control with the Picamera2 API
-from picamera2.devices import IMX500 # Imports the IMX500 device class, representing Sony’s IMX500 image sensor
-from picamera2.devices.imx500 import NetworkIntrinsics, postprocess_nanodet_detection # Imports NetworkIntrinsics for neural network metadata and postprocess_nanodet_detection for object detection result processing
-from picamera2.devices.imx500.postprocess import scale_boxes # Imports the scale_boxes function for adjusting bounding box coordinates to match image dimensions
+from video_recorder import VideoRecorder, DROP_POLICIES, DROP_OLDEST # Imports the recorder that encodes video frames off the camera thread
+from tensor_log import TensorLogWriter, TensorLogReader, ReplayIMX500, ReplayCamera, ReplayFinished # Imports the tensor log used to record and replay the inference outputs
+from person_tracker import PersonTracker # Imports the tracker that keeps persistent IDs and a target lock for detected people
+import latency_trace # Imports the per-stage latency histograms
+import telemetry # Imports the telemetry log and the rate-limited console output
+
+# The camera libraries (libcamera and picamera2) are only imported when a camera session starts, so importing this module stays cheap
 
 # --- General definitions ---
 
 main_loop_update_speed = 0.05
 
+default_model = "/usr/share/imx500-models/imx500_network_ssd_mobilenetv2_fpnlite_320x320_pp.rpk"
+
+settings = None # The running "PerceptionSession" (confidence threshold, IoU, max detections, ...)
+imx500 = None # The IMX500 device (or a stand-in), set when a session starts
+picam2 = None # The camera (or a stand-in), set when a session starts
+intrinsics = None # The network intrinsics of the loaded model
+
 obstacle_width_threshold = 0.25 # Sets the obstacle width threshold to 1/4 of the screen width
 obstacle_bottom_threshold = 0.8
 obstacle_center_x_threshold = 0.5
 
-last_detections = []
+obstacle_labels = {"chair", "couch", "bed", "bench", "table", "tv", "potted plant","car", "truck", "bottle", "vase", "wall", "refrigerator", "microwave"}
+
+CATEGORY_IGNORE = 0 # Roles a category can have in "get_tracking_data"
+CATEGORY_PERSON = 1
+CATEGORY_OBSTACLE = 2
+
+last_detections = None
+detection_buffers = None # Preallocated detection buffers, filled in rotation by "parse_detections"
+detection_buffer_count = 3 # One being written, one published, one still being read by a slow consumer
+detection_buffer_index = 0
+role_buffer = None # Work arrays of "get_tracking_data", preallocated with the detection buffers: the role of every detection,
+role_mask = None # the detections having one role,
+person_buffer = None # and the persons and obstacles of the frame, compacted out of its detections
+obstacle_buffer = None
+coordinate_transforms = {} # Cached inference-to-ISP coordinate transforms, keyed by scaler crop
 
 ignore_dash_labels = False
 
@@ -39,69 +63,146 @@ bounding_box_thickness = 2
 video_recording = True # Flag to enable or disable video recording
 video_recording_fps = 30 # Frames per second for video recording
 video_recording_size = (camera_frame_width, camera_frame_height) # Size of the video recording frame
+video_recording_buffer_count = 8 # Number of frames that can wait for the encoder
+video_recorder = None
 
-video_status_text = ""
+video_status_text = "" # Written with "set_video_status_text" (from the speech side), read by the video thread
+video_status_lock = threading.Lock()
 video_status_text_font = cv2.FONT_HERSHEY_PLAIN
 video_status_text_size = 1
 video_status_text_thickness = 1
 
-class Detection:
+detection_dtype = numpy.dtype([("box", numpy.int32, (4,)), ("confidence", numpy.float32), ("category", numpy.int32)]) # One detection record: box (x, y, w, h), confidence and category
+
+class Detections:
 
     """
-    Represents a single object detection.
+    Represents all detections of a single frame, stored in a preallocated NumPy structured array that is reused from frame to frame.
 
     """
 
-    def __init__(self, coords, category, confidence, metadata):
+    __slots__ = ("records", "boxes", "confidences", "categories", "count", "sensor_time")
+
+    def __init__(self, capacity):
 
         """
-        Creates a detection object recording the bounding box, the category and the confidence.
+        Creates a detections buffer with room for a fixed number of detections.
 
         Arguments:
-            "coords": The bounding box coordinates (x, y, w, h) as floats in the range [0.0, 1.0]
-            "category": The category index as an integer
-            "confidence": The confidence score as a float in the range [0.0, 1.0]
-            "metadata": The metadata dictionary from the camera
+            "capacity": The maximum number of detections the buffer can hold
 
         Returns:
             None
 
         """
 
-        self.category = category
-        self.confidence = confidence
-        self.box = imx500.convert_inference_coords(coords, metadata, picam2)
+        self.records = numpy.zeros(capacity, dtype = detection_dtype)
+        self.boxes = self.records["box"] # Field views are created once, so reading them doesn't allocate
+        self.confidences = self.records["confidence"]
+        self.categories = self.records["category"]
+        self.count = 0 # Number of valid records at the start of the buffer
+        self.sensor_time = None # Monotonic time at which the sensor captured the frame (for latency tracing)
+
+    def __len__(self):
+        return self.count
+
+def get_coordinate_transform(metadata):
+
+    """
+    Gets the per-axis scale and offset that maps normalized inference coordinates onto the ISP output.
+
+    The mapping only depends on the scaler crop, so it is derived once per crop from a single call to
+    "imx500.convert_inference_coords" and then reused for every box of every frame.
+
+    Arguments:
+        "metadata": The metadata dictionary from the camera
+
+    Returns:
+        "transform": A tuple (scale_x, offset_x, scale_y, offset_y, output_width, output_height)
+
+    """
+
+    scaler_crop = tuple(metadata.get("ScalerCrop", ())) # The crop decides the mapping, so it is used as the cache key
+
+    transform = coordinate_transforms.get(scaler_crop)
+
+    if transform is None: # If this crop hasn't been seen before:
+
+        x, y, width, height = imx500.convert_inference_coords((0.25, 0.25, 0.75, 0.75), metadata, picam2) # Convert a reference box well inside the frame
+
+        scale_x = width / 0.5
+        scale_y = height / 0.5
+        output_width, output_height = picam2.camera_configuration()["main"]["size"]
+
+        transform = (scale_x, x - 0.25 * scale_x, scale_y, y - 0.25 * scale_y, output_width, output_height)
+        coordinate_transforms[scaler_crop] = transform
+
+    return transform
 
-def parse_detections(metadata):
+def convert_inference_boxes(boxes, metadata, out):
+
+    """
+    Converts a batch of normalized (y0, x0, y1, x1) boxes into ISP output (x, y, w, h) boxes.
+
+    Arguments:
+        "boxes": An (N, 4) float array of boxes in "yx" order
+        "metadata": The metadata dictionary from the camera
+        "out": An (N, 4) integer array that receives the boxes (x, y, w, h)
+
+    Returns:
+        None
+
+    """
+
+    scale_x, offset_x, scale_y, offset_y, output_width, output_height = get_coordinate_transform(metadata)
+
+    left = numpy.clip(boxes[:, 1] * scale_x + offset_x, 0, output_width) # Box edges are clamped to the visible frame, like "convert_inference_coords" does
+    top = numpy.clip(boxes[:, 0] * scale_y + offset_y, 0, output_height)
+    right = numpy.clip(boxes[:, 3] * scale_x + offset_x, 0, output_width)
+    bottom = numpy.clip(boxes[:, 2] * scale_y + offset_y, 0, output_height)
+
+    out[:, 0] = left
+    out[:, 1] = top
+    out[:, 2] = right - left
+    out[:, 3] = bottom - top
+
+def parse_detections(metadata, numpy_outputs = None):
 
     """
     Parses the output tensor into a number of detected objects, scaled to the ISP output.
 
+    Thresholding, box reordering and coordinate conversion are done as array operations over the whole output tensor.
+    The results are written into the next of the preallocated detection buffers, which then becomes "last_detections".
+
     Arguments:
         "metadata": The metadata dictionary from the camera"
+        "numpy_outputs": The output tensors of the frame if the caller already got them from "imx500.get_outputs", otherwise they are read from "metadata"
     
     Returns:
-        "last_detections": A list of detection objects
+        "last_detections": The detections buffer holding the boxes, confidences and categories of the frame, or None if the frame has no outputs
 
     """
 
-    global last_detections
+    global last_detections, detection_buffer_index
 
     bounding_box_normalization = intrinsics.bbox_normalization # Boolean indicating if bounding boxes are normalized
     bounding_box_order = intrinsics.bbox_order # String indicating the order of bounding box coordinates ("yx" or "xy")
 
-    confidence_threshold = arguments.threshold # Float confidence threshold for filtering detections
-    iou = arguments.iou # Float IoU threshold for non-maximum suppression
-    max_detections = arguments.max_detections # Integer maximum number of detections to return
+    confidence_threshold = settings.threshold # Float confidence threshold for filtering detections
+    iou = settings.iou # Float IoU threshold for non-maximum suppression
+    max_detections = settings.max_detections # Integer maximum number of detections to return
 
-    numpy_outputs = imx500.get_outputs(metadata, add_batch = True) # Gets the output tensors from the metadata as a list of NumPy arrays
+    if numpy_outputs is None:
+        numpy_outputs = imx500.get_outputs(metadata, add_batch = True) # Gets the output tensors from the metadata as a list of NumPy arrays
     input_width, input_height = imx500.get_input_size() # Gets the input size of the model
 
     if numpy_outputs is None: # If no outputs are available:
-        return last_detections # Return the last detections
+        return None # "last_detections" still holds the previous frame, which callers must not pass off as this one
 
     if intrinsics.postprocess == "nanodet": # If the postprocessing method is "nanodet":
-        boxes, confidence_scores, classes = postprocess_nanodet_detection(outputs = numpy_outputs[0], confidence = confidence_threshold, iou_thres = iou, max_out_dets = max_detections)[0] # Postprocess the outputs using the nanodet method
+        postprocess_nanodet_detection, scale_boxes = get_nanodet_postprocess()
+
+        boxes, confidence_scores, classes = postprocess_nanodet_detection(outputs = numpy_outputs[0], conf = confidence_threshold, iou_thres = iou, max_out_dets = max_detections)[0] # Postprocess the outputs using the nanodet method
 
         boxes = scale_boxes(boxes, 1, 1, input_height, input_width, False, False) # Scale the bounding boxes to the input size
 
@@ -109,24 +210,52 @@ def parse_detections(metadata):
 
         boxes, confidence_scores, classes = numpy_outputs[0][0], numpy_outputs[1][0], numpy_outputs[2][0] # Extract boxes, confidence scores, and classes from the outputs
 
+    confidence_scores = numpy.asarray(confidence_scores)
+    detection_buffer_index = (detection_buffer_index + 1) % detection_buffer_count
+    detections = detection_buffers[detection_buffer_index] # Write into the oldest buffer, which nobody is reading anymore
+
+    indices = numpy.flatnonzero(confidence_scores > confidence_threshold)[:len(detections.records)] # Only keep the boxes whose confidence score is larger than the confidence threshold (at most "max_detections")
+    count = len(indices)
+
+    boxes = numpy.asarray(boxes, dtype = numpy.float32)[indices]
+
+    if intrinsics.postprocess != "nanodet":
+
         if bounding_box_normalization: # If bounding boxes are normalized:
-            boxes = boxes / input_height # Normalize boxes by input height
+            boxes /= input_height # Normalize boxes by input height
 
         if bounding_box_order == "xy": # If bounding box order is "xy":
             boxes = boxes[:, [1, 0, 3, 2]] # Reorder boxes to "yx" format
 
-        boxes = numpy.array_split(boxes, 4, axis = 1) # Split boxes into separate arrays for y0, x0, y1, x1
-        boxes = zip(*boxes) # Unzip the boxes into individual components
+    convert_inference_boxes(boxes, metadata, detections.boxes[:count])
+    detections.confidences[:count] = confidence_scores[indices]
+    detections.categories[:count] = numpy.asarray(classes)[indices]
+    detections.count = count
 
-    last_detections = []
-
-    for box, confidence_score, category in zip(boxes, confidence_scores, classes): # For every box, confidence score and category:
-        if confidence_score > confidence_threshold: # If the confidence score is larger than the confidence threshold:
-            detection = Detection(box, category, confidence_score, metadata) # Create a detection object
-            last_detections.append(detection) # Add it to "last_detections"
+    last_detections = detections
 
     return last_detections
 
+@lru_cache # Imported once, on the first NanoDet frame
+def get_nanodet_postprocess():
+
+    """
+    Imports the NanoDet postprocessing functions from picamera2.
+
+    Arguments:
+        None
+
+    Returns:
+        "postprocess_nanodet_detection": Decodes the NanoDet output tensor and runs non-maximum suppression
+        "scale_boxes": Scales the resulting boxes from model pixels to normalized coordinates
+
+    """
+
+    from picamera2.devices.imx500 import postprocess_nanodet_detection # Imports postprocess_nanodet_detection for object detection result processing
+    from picamera2.devices.imx500.postprocess import scale_boxes # Imports the scale_boxes function for adjusting bounding box coordinates to match image dimensions
+
+    return postprocess_nanodet_detection, scale_boxes
+
 @lru_cache # Caches the results of the function below (to avoid redundant computations)
 def get_labels():
 
@@ -156,6 +285,194 @@ def get_labels():
 
     return labels
 
+@lru_cache # The roles only depend on the model, so they are compiled once when it is loaded
+def get_category_roles():
+
+    """
+    Compiles the labels into a lookup array mapping every category index to its role (person, obstacle or ignore).
+
+    Arguments:
+        None
+
+    Returns:
+        "category_roles": An integer array indexed by category, holding CATEGORY_PERSON, CATEGORY_OBSTACLE or CATEGORY_IGNORE,
+                          with one more CATEGORY_IGNORE entry at the end that unknown categories are clipped to
+
+    """
+
+    labels = get_labels() # Uses the same (dash-filtered) labels as the ones drawn on the video
+
+    category_roles = numpy.full(len(labels) + 1, CATEGORY_IGNORE, dtype = numpy.int8)
+
+    for category, label in enumerate(labels):
+        if label == "person":
+            category_roles[category] = CATEGORY_PERSON
+        elif label in obstacle_labels:
+            category_roles[category] = CATEGORY_OBSTACLE
+
+    return category_roles
+
+# --- Overlay rendering ---
+
+@lru_cache(maxsize = 512) # Label texts repeat (category + confidence rounded to two decimals), so each one is only rendered once
+def get_text_sprite(text, font, scale, thickness, line_type = cv2.LINE_8):
+
+    """
+    Renders a text once into a small transparency mask that can be composited onto frames.
+
+    Arguments:
+        "text": The text to render
+        "font": The OpenCV font
+        "scale": The font scale
+        "thickness": The line thickness
+        "line_type": The OpenCV line type (e.g. cv2.LINE_AA for anti-aliasing)
+
+    Returns:
+        "transparency": A (height, width, 1) float array with how much of every pixel is not covered by the text (0.0 = text, 1.0 = background), from the top of the text to below the baseline
+        "text_height": The height of the text above the baseline (in pixels)
+
+    """
+
+    (text_width, text_height), baseline = cv2.getTextSize(text, font, scale, thickness)
+
+    canvas = numpy.zeros((text_height + baseline + 1, text_width + 1), dtype = numpy.uint8) # One extra row and column, like the inclusive corners of cv2.rectangle
+    cv2.putText(canvas, text, (0, text_height), font, scale, 255, thickness, line_type)
+
+    transparency = (1 - canvas.astype(numpy.float32) / 255)[:, :, None] # Stored inverted, which is what the compositing needs
+    transparency.flags.writeable = False # The sprite is shared between frames
+
+    return transparency, text_height
+
+def get_region(image, x, y, width, height):
+
+    """
+    Gets the part of a rectangle that lies inside the image, as a view (no copy).
+
+    Arguments:
+        "image": The image array
+        "x", "y": The top left corner of the rectangle (in pixels, may be outside the image)
+        "width", "height": The size of the rectangle (in pixels)
+
+    Returns:
+        "region": A view of the visible part of the rectangle, or None if nothing is visible
+        "offset_x", "offset_y": Where the visible part starts inside the rectangle
+
+    """
+
+    image_height, image_width = image.shape[:2]
+
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, image_width), min(y + height, image_height)
+
+    if x0 >= x1 or y0 >= y1:
+        return None, 0, 0
+
+    return image[y0:y1, x0:x1], x0 - x, y0 - y
+
+def draw_text_sprite(image, text, x, y, color, font, scale, thickness, line_type = cv2.LINE_8, background_opacity = None):
+
+    """
+    Draws a cached text sprite onto the image, only touching the pixels of the text rectangle.
+
+    Arguments:
+        "image": The image array to draw on (modified in place)
+        "text": The text to draw
+        "x", "y": The position of the text baseline start (like cv2.putText)
+        "color": The text color
+        "font", "scale", "thickness", "line_type": The text style (like cv2.putText)
+        "background_opacity": If given, a white background is blended under the text, keeping this much of the original image
+
+    Returns:
+        None
+
+    """
+
+    transparency, text_height = get_text_sprite(text, font, scale, thickness, line_type)
+    sprite_height, sprite_width = transparency.shape[:2]
+
+    region, offset_x, offset_y = get_region(image, x, y - text_height, sprite_width, sprite_height)
+
+    if region is None:
+        return
+
+    transparency = transparency[offset_y:offset_y + region.shape[0], offset_x:offset_x + region.shape[1]]
+    channels = region.shape[2]
+    color = numpy.array((tuple(color) + (0,) * channels)[:channels], dtype = numpy.float32) # Pads the color to the number of channels in the frame
+
+    blended = region.astype(numpy.float32) # The only temporary, all the math below is done in place
+
+    if background_opacity is not None: # Blend a white rectangle into the region only, instead of into a copy of the whole frame
+        white = numpy.array(((255, 255, 255) + (0,) * channels)[:channels], dtype = numpy.float32) # Padded like the color (cv2.rectangle leaves the padding channel at 0)
+        blended *= background_opacity
+        blended += (1 - background_opacity) * white
+        numpy.rint(blended, out = blended) # cv2.addWeighted rounds to whole pixel values before the text is drawn over them
+
+    blended -= color # color + (background - color) * transparency = text where covered, background elsewhere
+    blended *= transparency
+    blended += color
+
+    region[:] = numpy.rint(blended, out = blended) # Rounded like cv2.addWeighted, not truncated
+
+def set_video_status_text(message):
+
+    """
+    Sets the status text drawn at the bottom of the video.
+
+    Arguments:
+        "message": The text to show, or "" for none
+
+    Returns:
+        None
+
+    """
+
+    global video_status_text
+
+    with video_status_lock:
+        video_status_text = message
+
+def draw_overlay(image, detections):
+
+    """
+    Draws the detections and the status text onto an image.
+
+    Labels and the status text are drawn from cached sprites, only touching their own rectangles (no full-frame copies).
+
+    Arguments:
+        "image": The image array to draw on (modified in place)
+        "detections": The detections buffer to draw
+
+    Returns:
+        None
+
+    """
+
+    labels = get_labels() # Get the labels for the model
+
+    for index in range(detections.count): # For each detection:
+
+        x, y, width, height = detections.boxes[index].tolist() # Get the bounding box coordinates
+
+        label = f"{labels[detections.categories[index]]} ({detections.confidences[index]:.2f})" # Create the label text with category and confidence
+
+        text_x = x + 5 # Offset text x-position slightly from the bounding box
+        text_y = y + 15 # Offset text y-position slightly from the bounding box
+
+        draw_text_sprite(image, label, text_x, text_y, (0, 0, 255), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1, background_opacity = bounding_box_opacity) # Draw the label text on a blended background
+        cv2.rectangle(image, (x, y), (x + width, y + height), (0, 255, 0, 0), thickness = bounding_box_thickness) # Draw the bounding box around the detected object
+
+    with video_status_lock: # Read once, so the sprite is measured and drawn for the same text
+        status_text = video_status_text
+
+    if status_text: # If there is a video status text:
+
+        transparency, _ = get_text_sprite(status_text, video_status_text_font, video_status_text_size, video_status_text_thickness, cv2.LINE_AA) # Anti-aliasing
+
+        text_x = (camera_frame_width - transparency.shape[1]) // 2
+        text_y = camera_frame_height - 70
+
+        draw_text_sprite(image, status_text, text_x, text_y, (0, 255, 0), video_status_text_font, video_status_text_size, video_status_text_thickness, cv2.LINE_AA)
+
 def draw_detections(request, stream = "main"):
 
     """
@@ -170,33 +487,16 @@ def draw_detections(request, stream = "main"):
 
     """
 
-    global video_status_text
-
     detections = last_detections # Get the last detection results
 
     if detections is None:
         return
 
-    labels = get_labels() # Get the labels for the model
+    from picamera2 import MappedArray # Imports MappedArray for handling camera data (only reached when drawing on a real camera)
 
     with MappedArray(request, stream) as mapped: # Map the array for the specified stream
-        
-        for detection in detections: # For each detection:
 
-            x, y, width, height = detection.box # Get the bounding box coordinates
-
-            label = f"{labels[int(detection.category)]} ({detection.confidence:.2f})" # Create the label text with category and confidence
-
-            (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1) # Get the size of the text
-            text_x = x + 5 # Offset text x-position slightly from the bounding box
-            text_y = y + 15 # Offset text y-position slightly from the bounding box
-
-            overlay = mapped.array.copy() # Create a copy of the image array for overlay
-            cv2.rectangle(overlay, (text_x, text_y - text_height), (text_x + text_width, text_y + baseline), (255, 255, 255), cv2.FILLED) # Draw a filled rectangle for the text background
-
-            cv2.addWeighted(overlay, 1 - bounding_box_opacity, mapped.array, bounding_box_opacity, 0, mapped.array) # Blend the overlay with the original image
-            cv2.putText(mapped.array, label, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1) # Draw the label text on the image
-            cv2.rectangle(mapped.array, (x, y), (x + width, y + height), (0, 255, 0, 0), thickness = bounding_box_thickness) # Draw the bounding box around the detected object
+        draw_overlay(mapped.array, detections)
 
         if intrinsics.preserve_aspect_ratio: # If aspect ratio preservation is enabled:
             box_x, box_y, box_width, box_height = imx500.get_roi_scaled(request) # Get the scaled ROI (Region Of Interest) rectangle from "get_roi_scaled"
@@ -204,27 +504,8 @@ def draw_detections(request, stream = "main"):
             cv2.putText(mapped.array, "ROI", (box_x + 5, box_y + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1) # Label it
             cv2.rectangle(mapped.array, (box_x, box_y), (box_x + box_width, box_y + box_height), (255, 0, 0, 0)) # Draw it
 
-        if video_status_text: # If there is a video status text:
-            
-            (text_width, _), _ = cv2.getTextSize(video_status_text, video_status_text_font, video_status_text_size, video_status_text_thickness)
-
-            text_x = (camera_frame_width - text_width) // 2
-            text_y = camera_frame_height - 70
-
-            cv2.putText(
-                mapped.array,
-                video_status_text,
-                (text_x, text_y),
-                video_status_text_font,
-                video_status_text_size,
-               (0, 255, 0),
-                video_status_text_thickness,
-                cv2.LINE_AA # Anti-aliasing
-            )
-        
-        if video_recording: # If video recording is enabled:
-            frame_bgr = cv2.cvtColor(mapped.array, cv2.COLOR_RGB2BGR) # Convert the image from RGB to BGR format for OpenCV compatibility
-            video_writer.write(frame_bgr) # Write the frame to the video file if video recording is enabled
+        if video_recorder is not None: # If video recording is enabled:
+            video_recorder.submit(mapped.array) # Hand the frame over to the encoder thread (never waits unless the "block" policy is used)
 
 def get_arguments():
 
@@ -241,7 +522,7 @@ def get_arguments():
 
     parser = argparse.ArgumentParser() # Creates an ArgumentParser object for parsing command-line arguments
 
-    parser.add_argument("--model", type = str, help = "Path of the model", default = "/usr/share/imx500-models/imx500_network_ssd_mobilenetv2_fpnlite_320x320_pp.rpk") # Adds a command-line argument for the model path with a default value
+    parser.add_argument("--model", type = str, help = "Path of the model", default = default_model) # Adds a command-line argument for the model path with a default value
 
     parser.add_argument("--fps", type = int, help = "Frames per second") # Adds a command-line argument for frames per second
 
@@ -263,6 +544,22 @@ def get_arguments():
 
     parser.add_argument("--labels", type = str, help = "Path to the labels file") # Adds a command-line argument for labels file path
 
+    parser.add_argument("--video-drop-policy", choices = DROP_POLICIES, default = DROP_OLDEST, help = "What to do with video frames when the encoder falls behind") # Adds a command-line argument for the video recording drop policy
+
+    parser.add_argument("--record", type = str, help = "Record the inference output tensors to this tensor log") # Adds a command-line argument for recording a tensor log
+
+    parser.add_argument("--replay", type = str, help = "Replay a tensor log instead of using the camera") # Adds a command-line argument for replaying a tensor log
+
+    parser.add_argument("--replay-speed", choices = ["realtime", "fast"], default = "realtime", help = "Replay at the recorded pace or as fast as possible") # Adds a command-line argument for the replay speed
+
+    parser.add_argument("--follow-log", type = str, help = "Log the follow controller response (CSV) to this file, for tuning") # Adds a command-line argument for logging the follow controller
+
+    parser.add_argument("--telemetry", type = str, help = "Write binary telemetry records to this ring file (decode it with telemetry.py)") # Adds a command-line argument for the telemetry log
+
+    parser.add_argument("--verbose", action = "store_true", help = "Print rate-limited status lines to the console") # Adds a command-line argument for console output
+
+    parser.add_argument("--speech-process", action = "store_true", help = "Synthesize speech in a separate process, so it doesn't compete with the control loop") # Adds a command-line argument for the speech process
+
     parser.add_argument("--print-intrinsics", action = "store_true", help = "Print JSON network_intrinsics then exit") # Adds a command-line argument for printing intrinsics
 
     return parser.parse_args()
@@ -280,17 +577,201 @@ def get_direction(x_center_normalized):
     else: # Else (if the person is roughly in the middle):
         direction = "centered" # Set direction to "centered"
 
-    print(f"Person x: {x_center_normalized:.2f}| Direction: {direction}")
+    telemetry.console(f"Person x: {x_center_normalized:.2f}| Direction: {direction}", "direction")
     
     return direction
 
-def get_tracking_data():
+# --- Person tracking ---
+
+person_tracker = PersonTracker() # Keeps following the same person when several are in the frame
+tracked_sequence = None # Sequence number of the last frame fed to the tracker
+tracked_person = None # Box of the target in that frame, or None
+tracked_timestamp = None # Capture time of that frame (in seconds)
+tracked_sensor_time = None # Sensor time of that frame (in seconds, for latency tracing)
+
+# --- Background capture ---
+
+latest_frame = (0, 0.0, None) # Latest-value slot: (sequence number, capture timestamp, detections), replaced as a whole by the capture thread
+new_frame_event = threading.Event() # Set by the capture thread every time a frame is published
+frame_callbacks = [] # Functions called from the capture thread with the sequence number of every published frame (must not block)
+
+frames_captured = 0
+frames_dropped = 0 # Frames that were published but replaced before anyone read them
+last_read_sequence = 0
+
+capture_thread = None
+capture_shutdown = threading.Event()
+
+tensor_log_writer = None # Set when the inference outputs are being recorded with "--record"
+
+def capture_worker():
 
     """
-    Captures detections, tracks the person and checks for obstacles.
+    Runs in a separate thread — captures metadata, parses the detections and publishes them into "latest_frame".
 
     Arguments:
         None
+
+    Returns:
+        None
+
+    """
+
+    global latest_frame, frames_captured
+
+    start_time = time.perf_counter()
+
+    while not capture_shutdown.is_set():
+
+        try:
+            metadata = picam2.capture_metadata() # Blocks until the next frame arrives
+
+        except ReplayFinished: # If a replayed log has run out of frames:
+            elapsed_time = time.perf_counter() - start_time
+            print(f"Replay finished: {frames_captured} frames in {elapsed_time:.2f} s ({frames_captured / max(elapsed_time, 1e-9):.1f} frames per second)")
+            break
+
+        timestamp = metadata.get("ReplayTimestamp", time.monotonic())
+        sensor_time = latency_trace.get_sensor_time(metadata, timestamp)
+        latency_trace.mark("capture", sensor_time)
+
+        numpy_outputs = imx500.get_outputs(metadata, add_batch = True) # Fetched once, for the parser and the recorder
+        detections = parse_detections(metadata, numpy_outputs)
+
+        if detections is None: # No inference outputs for this frame, so there is nothing new to publish
+            continue
+
+        detections.sensor_time = sensor_time
+        latency_trace.mark("parse", sensor_time)
+
+        frames_captured += 1
+
+        latest_frame = (frames_captured, timestamp, detections) # A single reference assignment, so readers never see a half-written frame
+        new_frame_event.set()
+
+        for callback in frame_callbacks:
+            callback(frames_captured)
+
+        if tensor_log_writer is not None: # If recording, save the raw outputs so the frame can be replayed later (after publishing, so it doesn't add to the latency)
+            tensor_log_writer.append(numpy_outputs, metadata, get_coordinate_transform(metadata), frames_captured, timestamp)
+
+    new_frame_event.set() # Wakes up anyone waiting for a frame that will never come
+
+def start_capture():
+
+    """
+    Starts the background capture thread if it isn't already running.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    """
+
+    global capture_thread
+
+    if capture_thread is None or not capture_thread.is_alive():
+        capture_shutdown.clear()
+        capture_thread = threading.Thread(target = capture_worker, daemon = True)
+        capture_thread.start()
+
+def stop_capture(timeout = 1.0):
+
+    """
+    Stops the background capture thread.
+
+    Arguments:
+        "timeout": The maximum time to wait for the thread to finish (in seconds)
+
+    Returns:
+        None
+
+    """
+
+    global capture_thread
+
+    capture_shutdown.set()
+
+    if capture_thread is not None:
+        capture_thread.join(timeout = timeout)
+        capture_thread = None
+
+def get_capture_time(frame):
+
+    """
+    Gets the time at which the sensor captured a published frame.
+
+    Arguments:
+        "frame": A (sequence number, timestamp, detections) tuple from "latest_frame"
+
+    Returns:
+        "capture_time": The sensor time of the frame (monotonic, in seconds), or its timestamp if it has no detections
+
+    """
+
+    _, timestamp, detections = frame
+
+    if detections is None or detections.sensor_time is None:
+        return timestamp
+
+    return detections.sensor_time
+
+def get_latest_frame(wait_for_new_frame = False, timeout = 1.0, captured_after = None):
+
+    """
+    Reads the latest published frame without blocking on the camera.
+
+    Arguments:
+        "wait_for_new_frame": If True, waits until a frame newer than the last read one has been published
+        "timeout": The maximum time to wait for a new frame (in seconds)
+        "captured_after": If set, waits until a frame captured after this monotonic time has been published (e.g. after the robot stopped)
+
+    Returns:
+        "sequence": The sequence number of the frame (0 if nothing has been captured yet)
+        "timestamp": The monotonic time at which the frame was published
+        "detections": The detections buffer of the frame
+
+    """
+
+    global frames_dropped, last_read_sequence
+
+    if captured_after is not None: # A frame newer than the last read one can still have been exposed before "captured_after"
+
+        deadline = time.monotonic() + timeout
+
+        while get_capture_time(latest_frame) <= captured_after and time.monotonic() < deadline:
+            new_frame_event.clear()
+            if get_capture_time(latest_frame) <= captured_after: # Check again in case a frame was published right before clearing
+                new_frame_event.wait(deadline - time.monotonic())
+
+    elif wait_for_new_frame and latest_frame[0] <= last_read_sequence:
+        new_frame_event.clear()
+        if latest_frame[0] <= last_read_sequence: # Check again in case a frame was published right before clearing
+            new_frame_event.wait(timeout)
+
+    sequence, timestamp, detections = latest_frame
+
+    if sequence > last_read_sequence + 1:
+        frames_dropped += sequence - last_read_sequence - 1
+
+    last_read_sequence = max(last_read_sequence, sequence)
+
+    if detections is None:
+        detections = last_detections
+
+    return sequence, timestamp, detections
+
+def get_tracking_data(wait_for_new_frame = False, timeout = 1.0, captured_after = None):
+
+    """
+    Reads the latest detections, tracks the person and checks for obstacles.
+
+    Arguments:
+        "wait_for_new_frame": If True, waits for a frame captured after the previous call instead of reusing the latest one
+        "timeout": The maximum time to wait for that frame (in seconds)
+        "captured_after": If set, waits for a frame captured after this monotonic time instead (see "get_latest_frame")
     
     Returns:
         "direction":
@@ -299,13 +780,38 @@ def get_tracking_data():
 
     """
 
-    last_results = parse_detections(picam2.capture_metadata()) # Gets the latest results by calling "parse_detections"
+    global tracked_sequence, tracked_person, tracked_timestamp, tracked_sensor_time
+
+    sequence, timestamp, last_results = get_latest_frame(wait_for_new_frame, timeout, captured_after) # Gets the latest results published by the capture thread
+
+    count = last_results.count
+    boxes = last_results.boxes[:count]
+    categories = last_results.categories[:count]
+    roles = role_buffer[:count]
+    mask = role_mask[:count]
 
-    person_detections = []
+    numpy.take(get_category_roles(), categories, out = roles, mode = "clip") # Looks up the role of every detection at once (unknown categories are clipped to the trailing ignore entry)
 
-    for detection in last_results:
-        if intrinsics.labels[int(detection.category)] == "person":
-            person_detections.append(detection) # Collect each person detection in a list
+    numpy.equal(roles, CATEGORY_PERSON, out = mask) # One mask buffer, filled for one role at a time
+    person_count = int(numpy.count_nonzero(mask))
+    numpy.compress(mask, boxes, axis = 0, out = person_buffer.boxes[:person_count])
+
+    numpy.equal(roles, CATEGORY_OBSTACLE, out = mask)
+    obstacle_count = int(numpy.count_nonzero(mask))
+    numpy.compress(mask, boxes, axis = 0, out = obstacle_buffer.boxes[:obstacle_count])
+    numpy.compress(mask, categories, out = obstacle_buffer.categories[:obstacle_count])
+
+    person_detections = person_buffer.boxes[:person_count]
+    obstacle_detections = obstacle_buffer.boxes[:obstacle_count]
+    obstacle_categories = obstacle_buffer.categories[:obstacle_count]
+
+    new_frame = sequence != 0 and sequence != tracked_sequence # Sequence 0 is the empty slot from before the first capture
+
+    if new_frame: # Only feed each frame to the tracker once
+        tracked_person = person_tracker.update(person_detections, timestamp)
+        tracked_sequence = sequence
+        tracked_timestamp = timestamp
+        tracked_sensor_time = last_results.sensor_time
 
     person_area_normalized = None
     direction = "none"
@@ -315,9 +821,9 @@ def get_tracking_data():
     person_in_front = False
     
 
-    if person_detections: # If there are any person detections:
-        person = person_detections[0] # Select the first one
-        x, _, width, height = person.box # Extract its bounding box data
+    if tracked_person is not None: # If the tracked target is in the frame:
+        person = tracked_person # Follow the person the tracker is locked on to
+        x, _, width, height = person # Extract its bounding box data
         x_center = x + width / 2 # Find the horizontal center of the detected person (in pixels)
         x_center_normalized = x_center / camera_frame_width # Converts pixel position into normalized value between 0 and 1
         direction = get_direction(x_center_normalized)
@@ -329,83 +835,364 @@ def get_tracking_data():
             speed_bias = (person_area_normalized - 0.35)/-0.35
         speed = 50 + 50 * speed_bias
 
-    else: # Else (if there arent any person detections):
-        print("No person detected.")
+    else: # Else (if the target isn't detected):
+        telemetry.console("No person detected.")
 
-    obstacle_labels = {"chair", "couch", "bed", "bench", "table", "tv", "potted plant","car", "truck", "bottle", "vase", "wall", "refrigerator", "microwave"}
     obstacle_detected = False
 
-    for obstacle in last_results:
+    if len(obstacle_detections):
+
+        x, y, width, height = (obstacle_detections[:, column] for column in range(4))
+        obstacle_bottom = y + height
+
+        x_center_obstacle_normalized = (x + width / 2) / camera_frame_width
+        obstacle_bottom_normalized = obstacle_bottom / camera_frame_height
 
-        if intrinsics.labels[int(obstacle.category)] in obstacle_labels:
-            x, y, width, height = obstacle.box
+        in_driving_path = ((width / camera_frame_width) > obstacle_width_threshold) & (numpy.abs(x_center_obstacle_normalized - 0.5) < (obstacle_center_x_threshold/2)) & (obstacle_bottom_normalized > obstacle_bottom_threshold)
+        # An obstacle is in the way if its box is wider than the threshold, it is in the driving path and close enough
 
-            x_center_obstacle = x + width / 2
-            x_center_obstacle_normalized = x_center_obstacle / camera_frame_width 
-            obstacle_bottom = y + height
-            obstacle_bottom_normalized = obstacle_bottom / camera_frame_height
+        checked_obstacles = len(obstacle_detections)
 
-            for person in person_detections:
-                x_p, y_p, w_p, h_p = person.box
-                person_bottom = y_p + h_p
-                if person_bottom > obstacle_bottom:
-                    if (x_p < (x + width)) and ((x_p + w_p) > x):
-                        person_in_front = True
-                        break
+        if in_driving_path.any():
+            first_obstacle = int(numpy.argmax(in_driving_path))
+            checked_obstacles = first_obstacle + 1 # Obstacles after the first one in the way aren't checked
+            label = get_labels()[obstacle_categories[first_obstacle]]
+            telemetry.console(f"Obstacle detected: {label}", "obstacle")
+            obstacle_detected = True
 
-            if ((width / camera_frame_width) > obstacle_width_threshold and abs(x_center_obstacle_normalized - 0.5) < (obstacle_center_x_threshold/2) and obstacle_bottom_normalized > obstacle_bottom_threshold):
-                # If the obstacle box width is larger than the threshold, the obstacle is in the driving path and close enough
-                label = intrinsics.labels[int(obstacle.category)]
-                print(f"Obstacle detected: {label}")
-                obstacle_detected = True
-                break
+        if len(person_detections):
+
+            x_p, y_p, w_p, h_p = (person_detections[:, column] for column in range(4))
+
+            # Every obstacle (rows) against every person (columns): the person is further down in the frame and overlaps it horizontally
+            person_in_front_of_obstacle = ((y_p + h_p) > obstacle_bottom[:checked_obstacles, None]) & (x_p < (x + width)[:checked_obstacles, None]) & ((x_p + w_p) > x[:checked_obstacles, None])
+            person_in_front = bool(person_in_front_of_obstacle.any())
+
+    if new_frame:
+        latency_trace.mark("tracking", tracked_sensor_time)
 
     return direction, bias, speed, obstacle_detected, person_area_normalized, person_in_front
 
-# --- Camera setup ---
+def get_target_measurement():
+
+    """
+    Gets the position and size of the tracked person in the frame last read by "get_tracking_data", for closed-loop control.
+
+    Arguments:
+        None
 
-arguments = get_arguments()
-imx500 = IMX500(arguments.model) # Loads the IMX500 camera device and its neural network model file
-intrinsics = imx500.network_intrinsics or NetworkIntrinsics() # Retrieves the model’s metadata, and if unavailable, creates a default "NetworkIntrinsics" instance
+    Returns:
+        "measurement": A (timestamp, x_center_normalized, area_normalized) tuple, or None if the target isn't in that frame
 
-if not intrinsics.task: # If the task type isn't defined in the model metadata:
-    intrinsics.task = "object detection" # Set the task type to "object detection"
+    """
 
-picam2 = Picamera2(imx500.camera_num) # Creates a control object for the physical camera
+    if tracked_person is None:
+        return None
 
-config = picam2.create_preview_configuration( # Creates a preview configuration with:
-    controls = {"FrameRate": intrinsics.inference_rate}, # Frame rate from model intrinsics
-    buffer_count = 12, # 12 frame buffers (which improves the capture pipeline)
-    transform = libcamera.Transform(hflip = True, vflip = True) # Horizontal and vertical flipping
-)
+    x, _, width, height = tracked_person
 
-picam2.pre_callback = draw_detections # Before each frame is displayed, "draw_detections" is called to overlay bounding boxes and labels
-picam2.start(config, show_preview = True) # Starts the video streaming in a live preview window
+    return tracked_timestamp, float((x + width / 2) / camera_frame_width), float((width * height) / camera_frame_area)
 
-if intrinsics.preserve_aspect_ratio:
-    imx500.set_auto_aspect_ratio()
+# --- Perception session ---
 
-# --- Video recording setup ---
+class PerceptionSession:
 
-if video_recording:
+    """
+    Owns the camera (or a stand-in for it) and everything started with it, with an explicit start and stop.
+
+    Only one session runs at a time; while it runs, the module functions ("parse_detections", "get_tracking_data", ...) use it.
 
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") # Gets the current timestamp for the video file name
-    video_recording_path = f"/home/garage/Documents/repositories/The-Stalker-Bot/videos/{timestamp}.avi"
+    """
 
-    video_writer = cv2.VideoWriter(
-    video_recording_path,
-    cv2.VideoWriter_fourcc(*"XVID"), # Video codec for AVI format
-    video_recording_fps,
-    video_recording_size
-)
+    def __init__(self, model = default_model, threshold = 0.55, iou = 0.65, max_detections = 10, show_preview = True, video_recording = video_recording, video_drop_policy = DROP_OLDEST, record = None, replay = None, replay_speed = "realtime", imx500 = None, picam2 = None, capture = True):
+
+        """
+        Creates a session without touching any hardware.
+
+        Arguments:
+            "model": The path of the IMX500 network firmware
+            "threshold": The detection confidence threshold
+            "iou": The IoU threshold for non-maximum suppression
+            "max_detections": The maximum number of detections per frame
+            "show_preview": If True, the camera shows a live preview window
+            "video_recording": If True, the annotated frames are recorded to a video file
+            "video_drop_policy": What to do with video frames when the encoder falls behind
+            "record": A path to record the inference output tensors to, or None
+            "replay": A path of a tensor log to replay instead of using the camera, or None
+            "replay_speed": "realtime" or "fast"
+            "imx500": A stand-in for the IMX500 device (e.g. for benchmarks), or None to use the real one
+            "picam2": A stand-in for the camera, or None to use the real one
+            "capture": If True, frames are captured and parsed in the background once the session starts
+
+        Returns:
+            None
+
+        """
+
+        self.model = model
+        self.threshold = threshold
+        self.iou = iou
+        self.max_detections = max_detections
+        self.show_preview = show_preview
+        self.video_recording = video_recording
+        self.video_drop_policy = video_drop_policy
+        self.record = record
+        self.replay = replay
+        self.replay_speed = replay_speed
+        self.imx500 = imx500
+        self.picam2 = picam2
+        self.capture = capture
+
+        self.running = False
+        self.camera_started = False
+        self.startup_times = {} # Seconds spent in every startup step, in the order they ran
+
+    @classmethod
+    def from_arguments(cls, arguments, **kwargs):
+
+        """
+        Creates a session from the parsed command line arguments (see "get_arguments").
+
+        Arguments:
+            "arguments": The parsed command line arguments
+            "kwargs": Extra session parameters
+
+        Returns:
+            "session": The session (not started yet)
+
+        """
+
+        return cls(
+            model = arguments.model,
+            threshold = arguments.threshold,
+            iou = arguments.iou,
+            max_detections = arguments.max_detections,
+            video_drop_policy = arguments.video_drop_policy,
+            record = arguments.record,
+            replay = arguments.replay,
+            replay_speed = arguments.replay_speed,
+            **kwargs
+        )
+
+    def run_step(self, name, function, *args, **kwargs):
+
+        """
+        Runs one startup step and records how long it took.
+
+        Arguments:
+            "name": The name of the step
+            "function": The function to run
+            "args", "kwargs": Its arguments
+
+        Returns:
+            "result": What the function returned
+
+        """
+
+        start_time = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.startup_times[name] = time.perf_counter() - start_time
+
+        return result
+
+    def start(self):
+
+        """
+        Loads the model, starts the camera and the background workers.
+
+        Arguments:
+            None
+
+        Returns:
+            "session": The session itself
+
+        """
+
+        global settings, imx500, picam2, intrinsics, detection_buffers, last_detections, detection_buffer_index, video_recorder, tensor_log_writer
+        global role_buffer, role_mask, person_buffer, obstacle_buffer
+        global latest_frame, frames_captured, frames_dropped, last_read_sequence, tracked_sequence, tracked_person, tracked_timestamp, tracked_sensor_time
+
+        if self.running:
+            return self
+
+        settings = self
+
+        get_labels.cache_clear() # Labels, roles and transforms belong to the previous model and camera
+        get_category_roles.cache_clear()
+        coordinate_transforms.clear()
+        person_tracker.reset()
+
+        latest_frame = (0, 0.0, None) # The frames, counters and target of the previous session mustn't leak into this one
+        new_frame_event.clear()
+        frames_captured = frames_dropped = last_read_sequence = 0
+        tracked_sequence = tracked_person = tracked_timestamp = tracked_sensor_time = None
+
+        use_camera = self.imx500 is None and self.replay is None
+
+        if self.imx500 is not None:
+            imx500 = self.imx500
+
+        elif self.replay: # If replaying a tensor log, the recorded outputs stand in for the camera
+            imx500 = self.run_step("open replay", lambda: ReplayIMX500(TensorLogReader(self.replay)))
+
+        else:
+            from picamera2.devices import IMX500 # Imports the IMX500 device class, representing Sony’s IMX500 image sensor
+            imx500 = self.run_step("load model", IMX500, self.model) # Loads the IMX500 camera device and its neural network model file
+
+        intrinsics = imx500.network_intrinsics # Retrieves the model’s metadata
+
+        if not intrinsics: # If it's unavailable, creates a default "NetworkIntrinsics" instance
+            from picamera2.devices.imx500 import NetworkIntrinsics
+            intrinsics = NetworkIntrinsics()
+
+        if not intrinsics.task: # If the task type isn't defined in the model metadata:
+            intrinsics.task = "object detection" # Set the task type to "object detection"
+
+        self.run_step("compile labels", get_category_roles) # Compiles the category lookup table once, while the model is loaded
+
+        detection_buffers = tuple(Detections(self.max_detections) for _ in range(detection_buffer_count)) # Sized once to "max_detections" and reused for every frame
+        detection_buffer_index = 0
+        last_detections = detection_buffers[0]
+
+        role_buffer = numpy.empty(self.max_detections, dtype = numpy.int8)
+        role_mask = numpy.empty(self.max_detections, dtype = bool)
+        person_buffer = Detections(self.max_detections)
+        obstacle_buffer = Detections(self.max_detections)
+
+        if self.picam2 is not None:
+            picam2 = self.picam2
+
+        elif self.replay:
+            picam2 = ReplayCamera(imx500, realtime = self.replay_speed == "realtime")
+
+        else:
+            picam2 = self.run_step("open camera", self.open_camera)
+
+        if self.video_recording and use_camera:
+
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") # Gets the current timestamp for the video file name
+            video_recording_path = f"/home/garage/Documents/repositories/The-Stalker-Bot/videos/{timestamp}.avi"
+
+            video_recorder = self.run_step("open video recorder", VideoRecorder,
+                video_recording_path,
+                video_recording_fps,
+                video_recording_size,
+                buffer_count = video_recording_buffer_count,
+                drop_policy = self.video_drop_policy,
+                fourcc = "XVID" # Video codec for AVI format
+            )
+
+        if use_camera:
+            self.run_step("start camera", self.start_camera)
+
+        if self.record: # If recording, every captured frame is appended to the tensor log
+            tensor_log_writer = TensorLogWriter(self.record, imx500.get_input_size(), intrinsics)
+
+        if self.capture:
+            self.run_step("start capture", start_capture) # Starts capturing and parsing frames in the background
+
+        self.running = True
+
+        return self
+
+    def open_camera(self):
+
+        """
+        Creates the camera and its preview configuration.
+
+        Arguments:
+            None
+
+        Returns:
+            "camera": The Picamera2 object
+
+        """
+
+        import libcamera # Imports the libcamera module, which provides access to the camera framework
+        from picamera2 import Picamera2 # Imports the Picamera2 class for controlling the camera
+
+        camera = Picamera2(imx500.camera_num) # Creates a control object for the physical camera
+
+        self.camera_config = camera.create_preview_configuration( # Creates a preview configuration with:
+            controls = {"FrameRate": intrinsics.inference_rate}, # Frame rate from model intrinsics
+            buffer_count = 12, # 12 frame buffers (which improves the capture pipeline)
+            transform = libcamera.Transform(hflip = True, vflip = True) # Horizontal and vertical flipping
+        )
+
+        return camera
+
+    def start_camera(self):
+
+        """
+        Starts the camera stream with the detection overlay.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        picam2.pre_callback = draw_detections # Before each frame is displayed, "draw_detections" is called to overlay bounding boxes and labels
+        picam2.start(self.camera_config, show_preview = self.show_preview) # Starts the video streaming (in a live preview window if enabled)
+        self.camera_started = True
+
+        if intrinsics.preserve_aspect_ratio:
+            imx500.set_auto_aspect_ratio()
+
+    def stop(self):
+
+        """
+        Stops the background workers and the camera, and closes the recordings.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        global video_recorder, tensor_log_writer
+
+        if not self.running:
+            return
+
+        stop_capture()
+
+        if self.camera_started:
+            picam2.stop()
+            self.camera_started = False
+
+        if tensor_log_writer is not None:
+            tensor_log_writer.close()
+            tensor_log_writer = None
+
+        if video_recorder is not None:
+            video_recorder.close() # Encodes the remaining frames and finalizes the video file
+            print(f"Video frames: {video_recorder.get_stats()}")
+            video_recorder = None
+
+        self.running = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.stop()
 
 if __name__ == "__main__":
 
     print("Starting camera test...")
 
+    session = PerceptionSession.from_arguments(get_arguments()).start()
+
+    print(f"Startup times: {', '.join(f'{name} {seconds:.2f} s' for name, seconds in session.startup_times.items())}")
+
     try:
         while True:
-            direction, bias, speed, obstacle, person_area = get_tracking_data()
+            direction, bias, speed, obstacle, person_area, person_in_front = get_tracking_data()
 
             if person_area:
                 print(f"Person area (normalized): {person_area:.2f} | bias= {bias:.2f} | speed= {speed:.2f}")
@@ -417,6 +1204,7 @@ if __name__ == "__main__":
 
     except KeyboardInterrupt:
         print("Stopped by user.")
-        picam2.stop()
-        video_writer.release()
+
+    finally:
+        session.stop()
         cv2.destroyAllWindows()
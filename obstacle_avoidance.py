@@ -23,7 +23,8 @@ def check_left():
     tank_turn_counterclockwise(100, 0.45)
     time.sleep(0.5)  # adjust rotation
     stop()
-    obstacle_left = object_detection.get_tracking_data()[3]
+    stop_time = time.monotonic()
+    obstacle_left = object_detection.get_tracking_data(captured_after = stop_time)[3] # Waits for a frame taken after the robot stopped
     time.sleep(0.5)
     tank_turn_clockwise(100, 0.45)  # turn back
     time.sleep(0.55)
@@ -47,7 +48,8 @@ def check_right():
     tank_turn_clockwise(100, 0.45)
     time.sleep(0.55)
     stop()
-    obstacle_right = object_detection.get_tracking_data()[3]
+    stop_time = time.monotonic()
+    obstacle_right = object_detection.get_tracking_data(captured_after = stop_time)[3] # Waits for a frame taken after the robot stopped
     time.sleep(0.5)
     tank_turn_counterclockwise(100, 0.45)  # turn back
     time.sleep(0.5)
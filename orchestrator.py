@@ -0,0 +1,392 @@
+
+# --- Imports ---
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import termios
+import tty
+
+import speaker
+import object_detection
+import latency_trace
+import telemetry
+import main
+from follow_controller import FollowController
+from loop_timing import CycleMonitor
+from motor_controller import stop, set_velocity, disable_motors, start_output_thread, stop_output_thread, start_watchdog, stop_watchdog, get_watchdog_stats
+
+# --- General definitions ---
+
+announcement_channel_size = 8 # Cycle states waiting for the announcer, the oldest are dropped when the speech task falls behind
+lag_probe_interval = 0.05 # How often the event loop lag is measured (in seconds)
+report_interval = 10.0 # Time between printed runtime reports (in seconds)
+
+# --- Channels ---
+
+def put_latest(channel, item):
+
+    """
+    Puts an item into a bounded channel without waiting, dropping the oldest item when it is full.
+
+    Arguments:
+        "channel": The asyncio queue
+        "item": The item
+
+    Returns:
+        "dropped": True if an older item had to be dropped
+
+    """
+
+    dropped = False
+
+    if channel.full():
+        channel.get_nowait()
+        dropped = True
+
+    channel.put_nowait(item)
+
+    return dropped
+
+# --- Instrumentation ---
+
+class RuntimeStats:
+
+    """
+    Adds up where the wall-clock time of every control cycle goes, and how late the event loop runs callbacks.
+
+    """
+
+    def __init__(self):
+
+        """
+        Creates empty statistics.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        self.stage_times = {} # Total time per stage (in seconds)
+        self.stage_maximums = {}
+        self.cycles = 0
+        self.announcements_dropped = 0
+
+        self.lag_total = 0.0 # Sum of the event loop lags (in seconds)
+        self.lag_maximum = 0.0
+        self.lag_samples = 0
+
+    def add(self, stage, duration):
+
+        """
+        Adds the duration of one stage of a cycle.
+
+        Arguments:
+            "stage": The name of the stage
+            "duration": How long it took (in seconds)
+
+        Returns:
+            None
+
+        """
+
+        self.stage_times[stage] = self.stage_times.get(stage, 0.0) + duration
+        self.stage_maximums[stage] = max(self.stage_maximums.get(stage, 0.0), duration)
+
+    def add_lag(self, lag):
+
+        """
+        Adds one measurement of the event loop lag.
+
+        Arguments:
+            "lag": How much later than requested a sleeping task woke up (in seconds)
+
+        Returns:
+            None
+
+        """
+
+        self.lag_total += lag
+        self.lag_maximum = max(self.lag_maximum, lag)
+        self.lag_samples += 1
+
+    def get_stats(self):
+
+        """
+        Gets the average and maximum time per stage and the event loop lag.
+
+        Arguments:
+            None
+
+        Returns:
+            "stats": A dictionary with the cycle count, the stage times and the lag (in milliseconds)
+
+        """
+
+        cycles = max(self.cycles, 1)
+
+        return {
+            "cycles": self.cycles,
+            "stages_ms": {stage: {"average": round(total / cycles * 1000, 3), "maximum": round(self.stage_maximums[stage] * 1000, 3)} for stage, total in self.stage_times.items()},
+            "announcements_dropped": self.announcements_dropped,
+            "loop_lag_ms": {"average": round(self.lag_total / max(self.lag_samples, 1) * 1000, 3), "maximum": round(self.lag_maximum * 1000, 3)}
+        }
+
+# --- Tasks ---
+
+async def camera_task(frames):
+
+    """
+    Bridges the capture thread into the event loop: every published frame puts its sequence number into the "frames" channel.
+
+    Arguments:
+        "frames": The channel of new frame sequence numbers
+
+    Returns:
+        None
+
+    """
+
+    loop = asyncio.get_running_loop()
+
+    def on_frame(sequence): # Called from the capture thread
+        loop.call_soon_threadsafe(put_latest, frames, sequence)
+
+    object_detection.frame_callbacks.append(on_frame)
+
+    try:
+        await asyncio.Event().wait() # Nothing to do until cancelled, the callback does the work
+    finally:
+        object_detection.frame_callbacks.remove(on_frame)
+
+async def control_task(frames, announcements, controller, monitor, stats):
+
+    """
+    Runs one follow cycle for every new frame and hands the resulting messages to the speech task.
+
+    Arguments:
+        "frames": The channel of new frame sequence numbers
+        "announcements": The channel of (status, person area) pairs for the speech task
+        "controller": The follow controller
+        "monitor": The cycle monitor
+        "stats": The runtime statistics
+
+    Returns:
+        None
+
+    """
+
+    frame_timeout = main.frame_timeout_periods * monitor.period
+
+    while True:
+
+        wait_start = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(frames.get(), frame_timeout)
+
+        except TimeoutError: # The camera stalled
+            monitor.frame_received(None)
+            set_velocity(0)
+            continue
+
+        step_start = time.perf_counter()
+        status, person_area = main.follow_step(controller, monitor, wait_for_new_frame = False) # The frame is already published, so this doesn't block
+        step_end = time.perf_counter()
+
+        stats.announcements_dropped += put_latest(announcements, (status, person_area))
+
+        stats.add("frame_wait", step_start - wait_start)
+        stats.add("follow_step", step_end - step_start)
+        stats.add("hand_off", time.perf_counter() - step_end) # Putting the state into the announcement channel, the announcing itself is timed in the speech task
+        stats.cycles += 1
+
+async def speech_task(announcements, stats):
+
+    """
+    Hands the state of every cycle to the announcer, which decides what is worth saying.
+
+    Arguments:
+        "announcements": The channel of (status, person area) pairs
+        "stats": The runtime statistics
+
+    Returns:
+        None
+
+    """
+
+    try:
+        while True:
+
+            state = await announcements.get()
+
+            announce_start = time.perf_counter()
+            main.announce(*state) # "say_async" only queues the message, the speaker thread speaks it
+            stats.add("announce", time.perf_counter() - announce_start)
+
+    finally:
+        speaker.stop_tts(graceful = True, timeout = 0.5)
+
+async def keyboard_task(shutdown):
+
+    """
+    Sets "shutdown" when 'q' is pressed, reading stdin from the event loop instead of a blocking thread.
+
+    Arguments:
+        "shutdown": The event that stops the runtime
+
+    Returns:
+        None
+
+    """
+
+    if not sys.stdin.isatty(): # No keyboard to listen to (e.g. started as a service)
+        return
+
+    loop = asyncio.get_running_loop()
+    file_descriptor = sys.stdin.fileno()
+    old_settings = termios.tcgetattr(file_descriptor)
+    tty.setcbreak(file_descriptor) # Single key presses, without waiting for Enter
+
+    def on_input():
+        keys = os.read(file_descriptor, 32) # Straight from the descriptor: a buffered read could keep a 'q' that never makes it readable again
+        if b"q" in keys.lower():
+            print("\n'q' pressed — stopping program...")
+            shutdown.set()
+
+    loop.add_reader(file_descriptor, on_input)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        loop.remove_reader(file_descriptor)
+        termios.tcsetattr(file_descriptor, termios.TCSADRAIN, old_settings)
+
+async def instrumentation_task(stats, monitor):
+
+    """
+    Measures how late the event loop wakes up a sleeping task (the loop lag) and prints a report every "report_interval".
+
+    Arguments:
+        "stats": The runtime statistics
+        "monitor": The cycle monitor
+
+    Returns:
+        None
+
+    """
+
+    last_report_time = time.monotonic()
+
+    while True:
+
+        start_time = time.monotonic()
+        await asyncio.sleep(lag_probe_interval)
+        stats.add_lag(max(time.monotonic() - start_time - lag_probe_interval, 0.0))
+
+        if time.monotonic() - last_report_time >= report_interval:
+            last_report_time = time.monotonic()
+            print(f"\nRuntime: {stats.get_stats()} | Loop timing: {monitor.get_stats()}")
+
+# --- Runtime ---
+
+async def run(arguments):
+
+    """
+    Runs the robot as a set of asyncio tasks until 'q', Ctrl+C, SIGTERM or a failing task stops it, then shuts everything down in order.
+
+    Arguments:
+        "arguments": The parsed command line arguments from "object_detection.get_arguments"
+
+    Returns:
+        "stats": The runtime statistics
+
+    """
+
+    loop = asyncio.get_running_loop()
+    shutdown = asyncio.Event()
+
+    for signal_number in (signal.SIGINT, signal.SIGTERM): # Replaces the speaker's SIGINT handler while the runtime runs
+        loop.add_signal_handler(signal_number, shutdown.set)
+
+    loop.add_signal_handler(signal.SIGUSR1, latency_trace.print_report) # "kill -USR1 <pid>" prints the latency histograms
+
+    telemetry.console_enabled = arguments.verbose
+
+    if arguments.telemetry:
+        telemetry.open_log(arguments.telemetry)
+
+    if arguments.speech_process:
+        speaker.use_process() # Must happen before anything is said
+
+    perception = object_detection.PerceptionSession.from_arguments(arguments).start() # Loads the model and starts the camera
+    controller = FollowController(main.target_minimum_area, main.target_maximum_area, arguments.follow_log)
+    monitor = CycleMonitor(object_detection.intrinsics.inference_rate)
+    stats = RuntimeStats()
+
+    frames = asyncio.Queue(maxsize = 1) # Only the newest frame matters
+    announcements = asyncio.Queue(maxsize = announcement_channel_size)
+
+    start_output_thread()
+    start_watchdog()
+    speaker.prerender(main.status_messages)
+
+    tasks = [
+        asyncio.create_task(camera_task(frames), name = "camera"),
+        asyncio.create_task(control_task(frames, announcements, controller, monitor, stats), name = "control"),
+        asyncio.create_task(speech_task(announcements, stats), name = "speech"),
+        asyncio.create_task(keyboard_task(shutdown), name = "keyboard"),
+        asyncio.create_task(instrumentation_task(stats, monitor), name = "instrumentation")
+    ]
+
+    shutdown_task = asyncio.create_task(shutdown.wait(), name = "shutdown")
+
+    try:
+        pending = set(tasks) | {shutdown_task}
+
+        while not shutdown.is_set():
+
+            done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+
+            for task in done: # A crashed task stops the runtime (the keyboard task may simply have nothing to do)
+                if task is not shutdown_task and task.exception() is not None:
+                    print(f"\nTask {task.get_name()} failed: {task.exception()!r}")
+                    shutdown.set()
+
+    finally:
+        stop() # The wheels stop first, before anything else is torn down
+
+        for task in tasks + [shutdown_task]:
+            task.cancel()
+
+        await asyncio.gather(*tasks, shutdown_task, return_exceptions = True) # Every task runs its cleanup before the hardware is released
+
+        perception.stop()
+        controller.close()
+        stop_watchdog()
+        stop_output_thread()
+        stop()
+        disable_motors()
+
+        for signal_number in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1):
+            loop.remove_signal_handler(signal_number)
+
+        print(f"\nMotor watchdog: {get_watchdog_stats()}")
+        print(f"\nLoop timing: {monitor.get_stats()}")
+        print(f"\nRuntime: {stats.get_stats()}")
+        print(f"\nAnnouncements: {main.announcer.get_stats()} | Speech: {speaker.get_speech_stats()}")
+        latency_trace.print_report()
+        telemetry.close_log()
+
+    return stats
+
+# --- Execution ---
+
+if __name__ == "__main__":
+    asyncio.run(run(object_detection.get_arguments()))
+    print("\nbye bye")
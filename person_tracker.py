@@ -0,0 +1,271 @@
+
+# --- Imports ---
+
+import time
+import numpy
+
+# --- General definitions ---
+
+tracker_iou_threshold = 0.3 # Minimum overlap for a detection to be matched to a track
+tracker_max_misses = 5 # Number of frames a track survives without a matching detection
+tracker_min_hits = 2 # Number of matched frames before a track can become the target
+tracker_velocity_smoothing = 0.5 # Weight of the newest velocity measurement (0 = never update, 1 = no smoothing)
+
+# --- Helper functions ---
+
+def iou_matrix(boxes_a, boxes_b):
+
+    """
+    Computes the IoU (Intersection over Union) of every box in "boxes_a" with every box in "boxes_b".
+
+    Arguments:
+        "boxes_a": An (M, 4) array of boxes (x, y, w, h)
+        "boxes_b": An (N, 4) array of boxes (x, y, w, h)
+
+    Returns:
+        "iou": An (M, N) array of IoU values in the range [0.0, 1.0]
+
+    """
+
+    a_x0, a_y0 = boxes_a[:, 0, None], boxes_a[:, 1, None] # Column vectors, so the operations below broadcast to (M, N)
+    a_x1, a_y1 = a_x0 + boxes_a[:, 2, None], a_y0 + boxes_a[:, 3, None]
+
+    b_x0, b_y0 = boxes_b[:, 0], boxes_b[:, 1]
+    b_x1, b_y1 = b_x0 + boxes_b[:, 2], b_y0 + boxes_b[:, 3]
+
+    intersection_width = numpy.clip(numpy.minimum(a_x1, b_x1) - numpy.maximum(a_x0, b_x0), 0, None)
+    intersection_height = numpy.clip(numpy.minimum(a_y1, b_y1) - numpy.maximum(a_y0, b_y0), 0, None)
+    intersection = intersection_width * intersection_height
+
+    union = boxes_a[:, 2, None] * boxes_a[:, 3, None] + boxes_b[:, 2] * boxes_b[:, 3] - intersection
+
+    return intersection / numpy.maximum(union, 1e-9)
+
+def match_greedy(iou, iou_threshold):
+
+    """
+    Matches rows to columns of an IoU matrix, always taking the best remaining pair first.
+
+    Arguments:
+        "iou": An (M, N) array of IoU values
+        "iou_threshold": The minimum IoU for a pair to be matched
+
+    Returns:
+        "matches": A list of (row, column) pairs
+
+    """
+
+    matches = []
+
+    if iou.size == 0:
+        return matches
+
+    iou = iou.copy()
+
+    for _ in range(min(iou.shape)):
+
+        row, column = numpy.unravel_index(numpy.argmax(iou), iou.shape) # Best remaining pair
+
+        if iou[row, column] < iou_threshold: # If even the best pair overlaps too little:
+            break
+
+        matches.append((int(row), int(column)))
+        iou[row, :] = -1 # Neither the track nor the detection can be matched again
+        iou[:, column] = -1
+
+    return matches
+
+# --- Tracker ---
+
+class PersonTracker:
+
+    """
+    Tracks people across frames with persistent track IDs and keeps a lock on one of them as the target.
+
+    """
+
+    def __init__(self, iou_threshold = tracker_iou_threshold, max_misses = tracker_max_misses, min_hits = tracker_min_hits, velocity_smoothing = tracker_velocity_smoothing):
+
+        """
+        Creates an empty tracker.
+
+        Arguments:
+            "iou_threshold": The minimum IoU between a predicted track box and a detection to match them
+            "max_misses": The number of frames a track survives without a matching detection
+            "min_hits": The number of matched frames before a track can become the target
+            "velocity_smoothing": The weight of the newest velocity measurement
+
+        Returns:
+            None
+
+        """
+
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.velocity_smoothing = velocity_smoothing
+
+        self.boxes = numpy.zeros((0, 4), dtype = numpy.float32) # Track boxes (x, y, w, h)
+        self.velocities = numpy.zeros((0, 4), dtype = numpy.float32) # Box change per second
+        self.ids = numpy.zeros(0, dtype = numpy.int64)
+        self.hits = numpy.zeros(0, dtype = numpy.int32)
+        self.misses = numpy.zeros(0, dtype = numpy.int32)
+
+        self.next_id = 1
+        self.target_id = None
+        self.last_timestamp = None
+
+    def predict(self, timestamp):
+
+        """
+        Moves every track forward with its constant velocity to the given time.
+
+        Arguments:
+            "timestamp": The time of the new frame (in seconds)
+
+        Returns:
+            "predicted_boxes": An (M, 4) array with the predicted track boxes
+
+        """
+
+        if self.last_timestamp is None:
+            return self.boxes
+
+        elapsed_time = max(timestamp - self.last_timestamp, 0.0)
+
+        return self.boxes + self.velocities * elapsed_time
+
+    def update(self, detection_boxes, timestamp = None):
+
+        """
+        Associates the detections of a new frame with the existing tracks and updates the target lock.
+
+        Arguments:
+            "detection_boxes": An (N, 4) array of person boxes (x, y, w, h)
+            "timestamp": The time of the frame (in seconds), defaults to the current monotonic time
+
+        Returns:
+            "target_box": The box of the target if it was detected in this frame, otherwise None
+
+        """
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        detection_boxes = numpy.asarray(detection_boxes, dtype = numpy.float32).reshape(-1, 4)
+
+        predicted_boxes = self.predict(timestamp)
+        matches = match_greedy(iou_matrix(predicted_boxes, detection_boxes), self.iou_threshold)
+
+        matched_tracks = numpy.zeros(len(self.ids), dtype = bool)
+        matched_detections = numpy.zeros(len(detection_boxes), dtype = bool)
+
+        if matches:
+
+            track_indices, detection_indices = numpy.array(matches).T
+            matched_tracks[track_indices] = True
+            matched_detections[detection_indices] = True
+
+            if self.last_timestamp is not None and timestamp > self.last_timestamp:
+                measured_velocities = (detection_boxes[detection_indices] - self.boxes[track_indices]) / (timestamp - self.last_timestamp)
+                self.velocities[track_indices] += self.velocity_smoothing * (measured_velocities - self.velocities[track_indices])
+
+            self.boxes[track_indices] = detection_boxes[detection_indices]
+            self.hits[track_indices] += 1
+            self.misses[track_indices] = 0
+
+        unmatched_tracks = ~matched_tracks
+        self.boxes[unmatched_tracks] = predicted_boxes[unmatched_tracks] # Unmatched tracks coast on their prediction
+        self.misses[unmatched_tracks] += 1
+
+        keep = self.misses <= self.max_misses # Forget tracks that have been missing for too long
+        self.boxes, self.velocities, self.ids, self.hits, self.misses = self.boxes[keep], self.velocities[keep], self.ids[keep], self.hits[keep], self.misses[keep]
+
+        new_boxes = detection_boxes[~matched_detections] # Every unmatched detection starts a new track
+        new_count = len(new_boxes)
+
+        if new_count:
+            self.boxes = numpy.concatenate((self.boxes, new_boxes))
+            self.velocities = numpy.concatenate((self.velocities, numpy.zeros((new_count, 4), dtype = numpy.float32)))
+            self.ids = numpy.concatenate((self.ids, numpy.arange(self.next_id, self.next_id + new_count)))
+            self.hits = numpy.concatenate((self.hits, numpy.ones(new_count, dtype = numpy.int32)))
+            self.misses = numpy.concatenate((self.misses, numpy.zeros(new_count, dtype = numpy.int32)))
+            self.next_id += new_count
+
+        self.last_timestamp = timestamp
+
+        return self.update_target()
+
+    def update_target(self):
+
+        """
+        Keeps the current target while its track exists, otherwise locks on to the largest confirmed track.
+
+        Arguments:
+            None
+
+        Returns:
+            "target_box": The box of the target if it was detected in this frame, otherwise None
+
+        """
+
+        if self.target_id is not None and not numpy.any(self.ids == self.target_id): # If the target track has been forgotten:
+            self.target_id = None
+
+        if self.target_id is None:
+
+            candidates = numpy.flatnonzero((self.hits >= self.min_hits) & (self.misses == 0))
+
+            if len(candidates) == 0:
+                return None
+
+            areas = self.boxes[candidates, 2] * self.boxes[candidates, 3]
+            self.target_id = int(self.ids[candidates[numpy.argmax(areas)]]) # The largest person is most likely the closest one
+
+        index = numpy.flatnonzero(self.ids == self.target_id)[0]
+
+        if self.misses[index] > 0: # If the target wasn't seen in this frame:
+            return None
+
+        return self.boxes[index]
+
+    def reset(self):
+
+        """
+        Forgets every track and the target lock.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        self.__init__(self.iou_threshold, self.max_misses, self.min_hits, self.velocity_smoothing)
+
+# --- Benchmark ---
+
+if __name__ == "__main__":
+
+    print("Benchmarking the person tracker...")
+
+    random = numpy.random.default_rng(0)
+    frame_count = 2000
+    frame_time = 1 / 30
+
+    for detection_count in (1, 2, 5, 10, 20, 50):
+
+        tracker = PersonTracker()
+        boxes = numpy.column_stack((random.uniform(0, 560, detection_count), random.uniform(0, 380, detection_count), numpy.full(detection_count, 80.0), numpy.full(detection_count, 100.0)))
+        velocities = random.normal(0, 1, (detection_count, 2))
+
+        start_time = time.perf_counter()
+
+        for frame in range(frame_count):
+            boxes[:, :2] += velocities # Every person walks in a straight line
+            tracker.update(boxes + random.normal(0, 1, boxes.shape), frame * frame_time)
+
+        frame_cost = (time.perf_counter() - start_time) / frame_count
+
+        print(f"Detections: {detection_count:3d} | Per frame: {frame_cost * 1e6:8.1f} µs | Tracks: {len(tracker.ids)} | Target: {tracker.target_id}")
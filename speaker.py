@@ -2,17 +2,44 @@
 
 import pyttsx3
 import threading
-import queue
 import time
 import signal
 import sys
+import os
+import shutil
+import hashlib
+import socket
+import subprocess
+from collections import OrderedDict, deque
+from multiprocessing.connection import Connection
 
 # --- Settings ---
 speech_rate = 150
 speech_volume = 1.0
 
+phrase_cache_dir = os.environ.get("SPEECH_CACHE_DIR", os.path.expanduser("~/.cache/robot_speech"))
+phrase_cache_max_bytes = 20 * 1024 * 1024  # oldest-used phrases are evicted above this
+audio_player = ["aplay", "-q"]  # plays a cached WAV file directly
+speech_process = os.environ.get("SPEECH_PROCESS") == "1"  # synthesize in a separate process instead of a thread (see use_process)
+process_restart_delay = 1.0  # wait before restarting a crashed speech process, doubled after every crash
+process_stable_time = 10.0  # a process that ran this long before crashing resets the backoff
+process_max_failures = 5  # speech is given up after this many crashes in a row
+
 # --- Internal state ---
-_speech_queue = queue.Queue(maxsize=1)  # only keep latest message
+# priority levels: a higher level is spoken first and cuts off a lower one that is playing
+PRIORITY_LOW = 0  # e.g. numbers that change all the time
+PRIORITY_NORMAL = 1  # status messages
+PRIORITY_HIGH = 2  # safety warnings
+PRIORITY_NAMES = {PRIORITY_LOW: "low", PRIORITY_NORMAL: "normal", PRIORITY_HIGH: "high"}
+_PRIORITY_RENDER = PRIORITY_LOW - 1  # idle rendering into the cache, cut off by any message
+
+_pending = {}  # priority -> (message, say_async time), only the latest message per level is kept
+_queue_condition = threading.Condition()
+_stop_requested = False  # graceful stop: no more messages after the current one
+_current_priority = None  # priority of the phrase being spoken, None when idle
+_current_phrase = None  # id of the phrase being spoken, None when idle
+_phrase_count = 0  # ids handed out so far
+_preempted = False  # the current phrase was cut off by _preempt
 _worker_thread = None
 _worker_lock = threading.Lock()
 _worker_shutdown = threading.Event()
@@ -21,6 +48,184 @@ _ctrlc_vip = threading.Event()  # <--- VIP pass for Ctrl+C
 _engine_lock = threading.Lock()
 _engine = None
 
+_render_pending = deque()  # phrases to render into the cache while the worker is idle (guarded by _queue_condition)
+_cache_lock = threading.Lock()
+_cache_entries = None  # path -> size in bytes, least recently used first (loaded on first use)
+_player_process = None  # playback of a cached phrase, so stop_engine can cut it off
+_pending_start = [None]  # say_async time of the phrase being synthesized
+
+_process = None  # the speech process, when speech_process is set
+_process_connection = None  # pickled commands to it, replies from it
+_process_lock = threading.RLock()  # one command (and its reply) at a time; reentrant, as the SIGINT handler may stop the process in the middle of a send
+_process_stats = None  # last stats reported by a speech process that has exited
+_process_start_time = 0.0
+_process_failures = 0  # crashes in a row
+_process_retry_time = 0.0  # no restart before this (monotonic) time
+
+_stats = {"cache_hits": 0, "cache_misses": 0, "rendered": 0, "evicted": 0, "hit_latency_total": 0.0, "miss_latency_total": 0.0, "preempted": 0}
+_queue_stats = {priority: {"spoken": 0, "dropped": 0, "wait_total": 0.0, "wait_max": 0.0} for priority in PRIORITY_NAMES}
+
+
+# --- Phrase cache ---
+
+def _cache_path(message):
+    """Audio file of a phrase (the voice settings are part of the key)."""
+    key = f"{speech_rate}|{speech_volume}|{message}".encode()
+    return os.path.join(phrase_cache_dir, hashlib.sha1(key).hexdigest() + ".wav")
+
+
+def _load_cache():
+    """Indexes the cache directory, least recently used first."""
+    global _cache_entries
+    with _cache_lock:
+        if _cache_entries is not None:
+            return
+        os.makedirs(phrase_cache_dir, exist_ok=True)
+        files = [os.path.join(phrase_cache_dir, name) for name in os.listdir(phrase_cache_dir) if name.endswith(".wav")]
+        files.sort(key=os.path.getmtime)
+        _cache_entries = OrderedDict((path, os.path.getsize(path)) for path in files)
+
+
+def _cache_lookup(message):
+    """Returns the cached audio file of a phrase (and marks it as recently used), or None."""
+    _load_cache()
+    path = _cache_path(message)
+    with _cache_lock:
+        if path not in _cache_entries:
+            return None
+        _cache_entries.move_to_end(path)
+    try:
+        os.utime(path)  # keeps the LRU order across restarts
+    except OSError:
+        with _cache_lock:
+            _cache_entries.pop(path, None)
+        return None
+    return path
+
+
+def _cache_add(path):
+    """Adds a rendered file and evicts the least recently used ones above the size limit."""
+    with _cache_lock:
+        _cache_entries[path] = os.path.getsize(path)
+        _cache_entries.move_to_end(path)
+        total = sum(_cache_entries.values())
+        while total > phrase_cache_max_bytes and len(_cache_entries) > 1:
+            old_path, old_size = _cache_entries.popitem(last=False)
+            total -= old_size
+            _stats["evicted"] += 1
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+def _render(engine, message):
+    """Synthesizes a phrase into the cache (runs on the worker thread, which owns the engine)."""
+    _load_cache()
+    path = _cache_path(message)
+    with _cache_lock:
+        if path in _cache_entries:
+            return
+    temporary_path = path + ".part"
+    engine.save_to_file(message, temporary_path)
+    engine.runAndWait()
+    with _queue_condition:
+        preempted = _preempted
+        if preempted:
+            _render_pending.appendleft(message)  # rendered again the next time the worker is idle
+    if preempted:
+        try:
+            os.remove(temporary_path)  # cut off, so only part of the phrase was written
+        except OSError:
+            pass
+    elif os.path.exists(temporary_path) and os.path.getsize(temporary_path) > 0:
+        os.replace(temporary_path, path)  # never leaves a half-written phrase in the cache
+        _cache_add(path)
+        _stats["rendered"] += 1
+
+
+def _player_available():
+    return shutil.which(audio_player[0]) is not None
+
+
+def _play(path):
+    """Plays a cached phrase (blocks until it ends or stop_engine cuts it off)."""
+    global _player_process
+    process = subprocess.Popen(audio_player + [path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with _engine_lock:
+        _player_process = process
+    try:
+        process.wait()
+    finally:
+        with _engine_lock:
+            _player_process = None
+
+
+def _queue_render(messages):
+    with _queue_condition:
+        _render_pending.extend(messages)
+        _queue_condition.notify()
+
+
+def prerender(messages):
+    """Renders known phrases into the cache ahead of time, while the worker is idle."""
+    if speech_process:
+        _send("prerender", list(messages))
+        return
+    _ensure_worker()
+    _queue_render(messages)
+
+
+def get_speech_stats():
+    """Cache hits/misses and the average time from say_async to the start of audio."""
+    if speech_process:
+        return _process_request("stats") or _process_stats
+    stats = dict(_stats)
+    hit_latency_total, miss_latency_total = stats.pop("hit_latency_total"), stats.pop("miss_latency_total")
+    stats["average_hit_latency"] = hit_latency_total / stats["cache_hits"] if stats["cache_hits"] else None
+    stats["average_miss_latency"] = miss_latency_total / stats["cache_misses"] if stats["cache_misses"] else None
+    stats["queue"] = {
+        PRIORITY_NAMES[priority]: {
+            "spoken": level["spoken"],
+            "dropped": level["dropped"],
+            "average_wait": level["wait_total"] / level["spoken"] if level["spoken"] else None,
+            "maximum_wait": level["wait_max"],
+        }
+        for priority, level in _queue_stats.items()
+    }
+    return stats
+
+
+# --- Priority queue ---
+
+def _take():
+    """
+    Waits for work: the highest-priority pending message as (priority, message, queued time),
+    ("render", message) when no message is pending, or "stop".
+    """
+    global _current_priority, _current_phrase, _phrase_count, _preempted
+    with _queue_condition:
+        while not (_pending or _render_pending or _stop_requested or _ctrlc_vip.is_set()):
+            _queue_condition.wait()  # woken by say_async, prerender and stop_tts, no polling
+        if _stop_requested or _ctrlc_vip.is_set():
+            return "stop"
+        _phrase_count += 1
+        _current_phrase = _phrase_count
+        _preempted = False
+        if not _pending:
+            _current_priority = _PRIORITY_RENDER  # so a message arriving mid-render cuts it off
+            return "render", _render_pending.popleft()
+        priority = max(_pending)
+        message, queued_time = _pending.pop(priority)
+        _current_priority = priority
+
+    wait = time.monotonic() - queued_time
+    level = _queue_stats[priority]
+    level["spoken"] += 1
+    level["wait_total"] += wait
+    level["wait_max"] = max(level["wait_max"], wait)
+    return priority, message, queued_time
+
 
 def _tts_worker():
     """Background thread for speaking messages."""
@@ -31,6 +236,7 @@ def _tts_worker():
         engine = pyttsx3.init()
         engine.setProperty("rate", speech_rate)
         engine.setProperty("volume", speech_volume)
+        engine.connect("started-utterance", _on_utterance_started)
 
         with _engine_lock:
             _engine = engine
@@ -40,24 +246,38 @@ def _tts_worker():
             if _ctrlc_vip.is_set():
                 break
 
-            try:
-                message = _speech_queue.get(timeout=0.1)
-            except queue.Empty:
-                continue
+            item = _take()
 
-            if message is None:
+            if item == "stop":
                 break  # normal graceful stop
 
+            if item[0] == "render":
+                # idle: render one pending phrase into the cache
+                try:
+                    _render(engine, item[1])
+                except Exception:
+                    pass
+                finally:
+                    _end_phrase()
+                continue
+
+            _, message, queued_time = item
+
             try:
-                engine.say(message)
-                engine.runAndWait()
+                path = _cache_lookup(message) if _player_available() else None
+                if path is not None:
+                    _audio_started(queued_time, hit=True)
+                    _play(path)  # straight from the cache, no synthesis
+                else:
+                    _pending_start[0] = queued_time  # timed by the "started-utterance" callback
+                    engine.say(message)
+                    engine.runAndWait()
+                    if _player_available():
+                        _queue_render([message])  # cached for next time
             except Exception:
                 pass
             finally:
-                try:
-                    _speech_queue.task_done()
-                except Exception:
-                    pass
+                _end_phrase()
 
             # After speaking a message, check again if Ctrl+C arrived
             if _ctrlc_vip.is_set():
@@ -74,38 +294,221 @@ def _tts_worker():
             _engine = None
 
 
+def _audio_started(queued_time, hit):
+    """Records the time from say_async to the start of audio."""
+    latency = time.monotonic() - queued_time
+    if hit:
+        _stats["cache_hits"] += 1
+        _stats["hit_latency_total"] += latency
+    else:
+        _stats["cache_misses"] += 1
+        _stats["miss_latency_total"] += latency
+
+
+def _on_utterance_started(name):
+    """pyttsx3 callback when synthesized speech starts."""
+    queued_time, _pending_start[0] = _pending_start[0], None
+    if queued_time is not None:
+        _audio_started(queued_time, hit=False)
+
+
+def _end_phrase():
+    global _current_priority, _current_phrase
+    with _queue_condition:
+        _current_priority = None
+        _current_phrase = None
+
+
 def _ensure_worker():
-    global _worker_thread
+    global _worker_thread, _stop_requested
     with _worker_lock:
         if _worker_thread is None or not _worker_thread.is_alive():
             _worker_shutdown.clear()
             _ctrlc_vip.clear()
+            with _queue_condition:
+                _stop_requested = False
             _worker_thread = threading.Thread(target=_tts_worker, daemon=True)
             _worker_thread.start()
 
 
-def say_async(message):
-    """Queue message but keep only the most recent one."""
-    if _ctrlc_vip.is_set():
-        # Ctrl+C in progress → ignore new speech entirely
+# --- Speech process ---
+
+def use_process(enabled=True):
+    """Runs synthesis in a separate process instead of a thread (call before the first say_async)."""
+    global speech_process
+    speech_process = enabled
+
+
+def _process_failed(now):
+    """Counts a crash and schedules the next restart (the caller holds _worker_lock)."""
+    global _process_failures, _process_retry_time
+    if now - _process_start_time >= process_stable_time:
+        _process_failures = 0  # it had been running fine, so this is a new problem
+    _process_failures += 1
+    _process_retry_time = now + process_restart_delay * 2 ** (_process_failures - 1)
+    if _process_failures == process_max_failures:
+        print(f"Speech process failed {_process_failures} times in a row, speech is off.")
+
+
+def _ensure_process():
+    """Starts the speech process if it isn't running; returns False while a crashed one is backing off (or given up)."""
+    global _process, _process_connection, _process_start_time
+    with _worker_lock:
+        if _process is not None and _process.poll() is None:
+            return True
+        now = time.monotonic()
+        if _process is not None:  # crashed (a stopped one is cleared by _stop_process)
+            _process_failed(now)
+            _process_connection.close()
+            _process = _process_connection = None
+        if _process_failures >= process_max_failures or now < _process_retry_time:
+            return False  # keeps the control loop from starting an interpreter on every say_async
+        # a fresh interpreter running this file, rather than multiprocessing: spawning would re-import
+        # the caller's __main__ (camera, motors), and forking would copy their threads' locks
+        parent_socket, child_socket = socket.socketpair()
+        environment = dict(os.environ, SPEECH_CACHE_DIR=phrase_cache_dir, SPEECH_PROCESS="0")
+        try:
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--serve", str(child_socket.fileno()), str(speech_rate), str(speech_volume)],
+                pass_fds=[child_socket.fileno()],
+                env=environment,
+                start_new_session=True,  # Ctrl+C reaches only this process, which stops the child gracefully
+            )
+        except OSError:
+            parent_socket.close()
+            _process_failed(now)
+            return False
+        finally:
+            child_socket.close()
+        _process = process
+        _process_start_time = now
+        _process_connection = Connection(parent_socket.detach())
+        return True
+
+
+def _send(*command):
+    """Sends a command to the speech process, starting it if needed."""
+    if not _ensure_process():
         return
+    with _process_lock:
+        try:
+            _process_connection.send(command)
+        except (OSError, ValueError, AttributeError):
+            pass  # the process died (or was just stopped), the next command restarts it after the backoff
 
-    _ensure_worker()
-    try:
-        _speech_queue.put_nowait(message)
-    except queue.Full:
+
+def _process_request(*command, timeout=1.0):
+    """Sends a command to a running speech process and returns its reply, or None."""
+    with _process_lock:
+        if _process is None or _process.poll() is not None:
+            return None
         try:
-            _speech_queue.get_nowait()
-            _speech_queue.task_done()
-        except queue.Empty:
+            _process_connection.send(command)
+            if _process_connection.poll(timeout):
+                return _process_connection.recv()
+        except (OSError, EOFError, ValueError):
             pass
-        _speech_queue.put_nowait(message)
+    return None
+
+
+def _stop_process(graceful, timeout):
+    global _process, _process_connection, _process_stats
+    if _process is None:
+        return
+    reply = _process_request("stop", graceful, timeout, timeout=timeout + 0.5)
+    if reply is not None:
+        _process_stats = reply
+    try:
+        _process.wait(timeout=0.5)
+    except subprocess.TimeoutExpired:
+        _process.kill()
+        _process.wait()
+    _process_connection.close()
+    _process = _process_connection = None
+
+
+def _serve(file_descriptor):
+    """Main loop of the speech process: runs the usual worker thread and feeds it the commands from the parent."""
+    global speech_process
+    speech_process = False  # this process speaks itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    connection = Connection(file_descriptor)
+    while True:
+        try:
+            command, *arguments = connection.recv()  # blocks until the parent sends something
+        except (EOFError, OSError):
+            stop_tts(graceful=False)  # the parent is gone
+            return
+        if command == "say":
+            _enqueue(*arguments)
+        elif command == "stop_engine":
+            stop_engine()
+        elif command == "prerender":
+            prerender(arguments[0])
+        elif command == "stats":
+            connection.send(get_speech_stats())
+        elif command == "stop":
+            stop_tts(*arguments)
+            connection.send(get_speech_stats())
+            return
+
+
+# --- Public API ---
+
+def _enqueue(message, priority, queued_time):
+    _ensure_worker()
+    with _queue_condition:
+        if priority in _pending:
+            _queue_stats[priority]["dropped"] += 1
+        _pending[priority] = (message, queued_time)
+        outranked = _current_phrase if _current_priority is not None and priority > _current_priority else None
+        _queue_condition.notify()
+
+    if outranked is not None:
+        _preempt(outranked)
+
+
+def _preempt(phrase):
+    """Cuts off a phrase or render, unless the worker has moved on from it (it may already be speaking the message that outranked it)."""
+    global _preempted
+    with _queue_condition:
+        if _current_phrase != phrase:
+            return
+        if _current_priority != _PRIORITY_RENDER:
+            _stats["preempted"] += 1
+        _preempted = True
+        stop_engine()  # under the lock, so the worker can't take the next phrase in between
+
+
+def say_async(message, priority=PRIORITY_NORMAL):
+    """
+    Queue message, keeping only the most recent one per priority level.
+    A message with a higher priority than the phrase being spoken cuts it off.
+    """
+    if _ctrlc_vip.is_set():
+        # Ctrl+C in progress → ignore new speech entirely
+        return
+
+    if speech_process:
+        _send("say", message, priority, time.monotonic())  # the monotonic clock is shared by both processes
+    else:
+        _enqueue(message, priority, time.monotonic())
 
 
 def stop_engine():
     """Immediately stop current speech."""
+    if speech_process:
+        if _process is not None:
+            _send("stop_engine")
+        return
     with _engine_lock:
         eng = _engine
+        player = _player_process
+    if player is not None:
+        try:
+            player.terminate()
+        except Exception:
+            pass
     if eng is not None:
         try:
             eng.stop()
@@ -119,21 +522,23 @@ def stop_tts(graceful=True, timeout=2.0):
     - graceful=True → finish current phrase, no new ones.
     - graceful=False → interrupt immediately.
     """
+    global _stop_requested
+    if speech_process:
+        _stop_process(graceful, timeout)
+        return
+
     if graceful:
         _worker_shutdown.set()
-        try:
-            _speech_queue.put_nowait(None)
-        except queue.Full:
-            try:
-                _speech_queue.get_nowait()
-                _speech_queue.task_done()
-            except queue.Empty:
-                pass
-            _speech_queue.put_nowait(None)
+        with _queue_condition:
+            _pending.clear()
+            _stop_requested = True
+            _queue_condition.notify()
     else:
         stop_engine()
         _worker_shutdown.set()
-        _ctrlc_vip.set()
+        with _queue_condition:
+            _ctrlc_vip.set()
+            _queue_condition.notify()
 
     global _worker_thread
     if _worker_thread is not None:
@@ -164,7 +569,11 @@ signal.signal(signal.SIGINT, _sigint_handler)
 
 
 # --- Example test ---
-if __name__ == "__main__":
+if __name__ == "__main__" and sys.argv[1:2] == ["--serve"]:
+    # started by _ensure_process: --serve <socket fd> <rate> <volume>
+    speech_rate, speech_volume = int(sys.argv[3]), float(sys.argv[4])
+    _serve(int(sys.argv[2]))
+elif __name__ == "__main__":
     print("TTS running. Press Ctrl+C to test graceful VIP shutdown.")
     try:
         i = 0
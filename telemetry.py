@@ -0,0 +1,295 @@
+
+# --- Imports ---
+
+import os
+import sys
+import csv
+import mmap
+import time
+import struct
+import argparse
+import numpy
+
+# --- Log format ---
+
+# File:    FILE_MAGIC | record size (uint32) | capacity (uint32) | records written (uint64) | records[capacity]
+# The records form a ring: record N is stored at index N % capacity, and "records written" is updated after the record,
+# so a reader (or a crash) never sees a counted record that is only half written.
+
+FILE_MAGIC = b"STBTTEL1"
+FILE_HEADER = struct.Struct("<8sIIQ")
+
+DIRECTIONS = ["none", "left", "centered", "right"] # Direction codes, by index
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+FLAG_PERSON = 1 # The target person is in the frame
+FLAG_OBSTACLE = 2 # An obstacle is in the driving path
+FLAG_PERSON_IN_FRONT = 4 # The person is in front of the obstacle
+
+record_dtype = numpy.dtype([
+    ("timestamp", numpy.float64), # Capture time of the frame (monotonic, in seconds)
+    ("sequence", numpy.uint32),
+    ("direction", numpy.uint8),
+    ("flags", numpy.uint8),
+    ("padding", numpy.uint16),
+    ("area", numpy.float32), # Normalized person area (NaN if no person)
+    ("x_center", numpy.float32), # Normalized horizontal center of the person (NaN if no person)
+    ("speed", numpy.float32),
+    ("bias", numpy.float32),
+    ("linear", numpy.float32), # Commanded linear speed (in %)
+    ("angular", numpy.float32) # Commanded angular speed (in %)
+])
+
+default_capacity = 65536 # Records kept in the ring (about 36 minutes at 30 frames per second)
+
+# --- Writer ---
+
+class TelemetryLog:
+
+    """
+    Writes fixed-size binary telemetry records into a memory-mapped ring file, overwriting the oldest records when full.
+
+    """
+
+    def __init__(self, path, capacity = default_capacity):
+
+        """
+        Creates (or overwrites) the ring file and maps it.
+
+        Arguments:
+            "path": The path of the telemetry file
+            "capacity": The number of records the ring holds
+
+        Returns:
+            None
+
+        """
+
+        size = FILE_HEADER.size + capacity * record_dtype.itemsize
+
+        with open(path, "wb") as file:
+            file.truncate(size)
+
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.map[:FILE_HEADER.size] = FILE_HEADER.pack(FILE_MAGIC, record_dtype.itemsize, capacity, 0)
+
+        self.capacity = capacity
+        self.records = numpy.ndarray(capacity, dtype = record_dtype, buffer = self.map, offset = FILE_HEADER.size) # Writes go straight into the mapped file
+        self.records_written = numpy.ndarray(1, dtype = numpy.uint64, buffer = self.map, offset = FILE_HEADER.size - 8)
+
+    def write(self, timestamp, sequence, direction, flags, area, x_center, speed, bias, linear, angular):
+
+        """
+        Appends one record.
+
+        Arguments:
+            "timestamp": The capture time of the frame (in seconds)
+            "sequence": The sequence number of the frame
+            "direction": "none", "left", "centered" or "right"
+            "flags": A combination of FLAG_PERSON, FLAG_OBSTACLE and FLAG_PERSON_IN_FRONT
+            "area": The normalized person area, or None
+            "x_center": The normalized horizontal center of the person, or None
+            "speed": The speed from "get_tracking_data"
+            "bias": The bias from "get_tracking_data", or None
+            "linear": The commanded linear speed (in %)
+            "angular": The commanded angular speed (in %)
+
+        Returns:
+            None
+
+        """
+
+        count = int(self.records_written[0])
+
+        self.records[count % self.capacity] = (
+            timestamp,
+            sequence or 0,
+            DIRECTION_CODES.get(direction, 0),
+            flags,
+            0,
+            numpy.nan if area is None else area,
+            numpy.nan if x_center is None else x_center,
+            speed or 0.0,
+            numpy.nan if bias is None else bias,
+            linear,
+            angular
+        )
+
+        self.records_written[0] = count + 1 # Committed only once the record is complete
+
+    def close(self):
+
+        """
+        Flushes and unmaps the ring file.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        del self.records, self.records_written # The views must go before the map can be closed
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+telemetry_log = None # The open telemetry log, or None when telemetry is off
+
+def open_log(path, capacity = default_capacity):
+
+    """
+    Opens the telemetry log that "record" writes to.
+
+    Arguments:
+        "path": The path of the telemetry file
+        "capacity": The number of records the ring holds
+
+    Returns:
+        None
+
+    """
+
+    global telemetry_log
+
+    telemetry_log = TelemetryLog(path, capacity)
+
+def close_log():
+
+    """
+    Closes the telemetry log, if one is open.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    """
+
+    global telemetry_log
+
+    if telemetry_log is not None:
+        telemetry_log.close()
+        telemetry_log = None
+
+def record(*args):
+
+    """
+    Writes a record to the open telemetry log, if there is one (see "TelemetryLog.write" for the arguments).
+
+    """
+
+    if telemetry_log is not None:
+        telemetry_log.write(*args)
+
+# --- Console output ---
+
+console_enabled = False # Human-readable output is opt-in, so a slow terminal can't slow down the loop
+console_interval = 1.0 # Minimum time between two console lines with the same key (in seconds)
+
+console_last_times = {} # Time of the last printed line, by key
+console_suppressed = {} # Lines skipped since then, by key
+
+def console(message, key = None):
+
+    """
+    Prints a message if console output is enabled, at most once per "console_interval" for the same key.
+
+    Arguments:
+        "message": The message
+        "key": Messages with the same key share a rate limit, defaults to the message itself
+
+    Returns:
+        None
+
+    """
+
+    if not console_enabled:
+        return
+
+    if key is None:
+        key = message
+
+    now = time.monotonic()
+
+    if now - console_last_times.get(key, -console_interval) < console_interval:
+        console_suppressed[key] = console_suppressed.get(key, 0) + 1
+        return
+
+    suppressed = console_suppressed.pop(key, 0)
+    console_last_times[key] = now
+
+    print(message + (f" (+{suppressed} suppressed)" if suppressed else ""))
+
+# --- Decoder ---
+
+def read_log(path):
+
+    """
+    Reads a telemetry file, oldest record first.
+
+    Arguments:
+        "path": The path of the telemetry file
+
+    Returns:
+        "records": A structured array of the records still in the ring
+
+    """
+
+    with open(path, "rb") as file:
+        data = file.read()
+
+    magic, record_size, capacity, records_written = FILE_HEADER.unpack_from(data, 0)
+
+    if magic != FILE_MAGIC:
+        raise ValueError(f"{path} is not a telemetry file")
+
+    if record_size != record_dtype.itemsize:
+        raise ValueError(f"{path} has records of {record_size} bytes, expected {record_dtype.itemsize}")
+
+    records = numpy.frombuffer(data, dtype = record_dtype, count = capacity, offset = FILE_HEADER.size)
+
+    if records_written <= capacity:
+        return records[:records_written].copy()
+
+    start = records_written % capacity # The oldest record, right after the newest one
+
+    return numpy.concatenate((records[start:], records[:start]))
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Decodes a telemetry file into readable text or CSV")
+    parser.add_argument("path", type = str, help = "The telemetry file")
+    parser.add_argument("--csv", type = str, help = "Write the records as CSV to this file ('-' for stdout)")
+    parser.add_argument("--last", type = int, help = "Only decode the newest N records")
+    arguments = parser.parse_args()
+
+    records = read_log(arguments.path)
+
+    if arguments.last:
+        records = records[-arguments.last:]
+
+    fields = [name for name in record_dtype.names if name != "padding"]
+
+    if arguments.csv:
+
+        file = sys.stdout if arguments.csv == "-" else open(arguments.csv, "w", newline = "")
+        writer = csv.writer(file)
+        writer.writerow(fields)
+
+        for entry in records:
+            writer.writerow([DIRECTIONS[entry[name]] if name == "direction" else entry[name] for name in fields])
+
+        if file is not sys.stdout:
+            file.close()
+
+    else:
+
+        for entry in records:
+            flags = "".join(flag if entry["flags"] & bit else "-" for flag, bit in (("P", FLAG_PERSON), ("O", FLAG_OBSTACLE), ("F", FLAG_PERSON_IN_FRONT)))
+            print(f"{entry['timestamp']:12.3f} #{entry['sequence']:<7d} {DIRECTIONS[entry['direction']]:8s} {flags} area {entry['area']:.3f} x {entry['x_center']:.3f} speed {entry['speed']:6.1f} bias {entry['bias']:.2f} linear {entry['linear']:6.1f} angular {entry['angular']:6.1f}")
+
+        print(f"{len(records)} records from {os.path.basename(arguments.path)}")
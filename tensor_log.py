@@ -0,0 +1,433 @@
+
+# --- Imports ---
+
+import json
+import mmap
+import struct
+import time
+import types
+import numpy
+
+# --- Log format ---
+
+# File:    FILE_MAGIC | header length (uint32) | header JSON | padding to 8 bytes | records...
+# Record:  RECORD_MAGIC | tensor count | sequence | timestamp | metadata length | metadata JSON | padding | tensors...
+# Tensor:  dtype string (8 bytes) | number of dimensions | shape (int64 each) | padding | raw data | padding
+# Every part starts at a multiple of 8 bytes, so the tensors can be mapped straight into NumPy arrays.
+
+FILE_MAGIC = b"STBTLOG1"
+RECORD_MAGIC = b"REC1"
+
+FILE_HEADER = struct.Struct("<8sI")
+RECORD_HEADER = struct.Struct("<4sIqdI")
+TENSOR_HEADER = struct.Struct("<8sI")
+
+INTRINSICS_FIELDS = ("task", "labels", "bbox_normalization", "bbox_order", "postprocess", "ignore_dash_labels", "preserve_aspect_ratio", "inference_rate")
+METADATA_FIELDS = ("ScalerCrop", "SensorTimestamp", "FrameDuration")
+
+log_growth = 16 * 1024 * 1024 # Bytes the mapped log file grows by when a record doesn't fit anymore
+
+def get_padding(length):
+    return -length % 8
+
+# --- Writer ---
+
+class TensorLogWriter:
+
+    """
+    Appends the inference output tensors and metadata of every frame to a memory-mapped log file.
+
+    """
+
+    def __init__(self, path, input_size, intrinsics):
+
+        """
+        Creates the log file and writes its header.
+
+        Arguments:
+            "path": The path of the log file (overwritten if it exists)
+            "input_size": The (width, height) of the model input
+            "intrinsics": The network intrinsics of the model
+
+        Returns:
+            None
+
+        """
+
+        header = json.dumps({
+            "input_size": list(input_size),
+            "intrinsics": {field: getattr(intrinsics, field, None) for field in INTRINSICS_FIELDS}
+        }).encode()
+
+        self.file = open(path, "w+b")
+        self.map = None
+        self.length = 0 # Bytes used so far, the rest of the mapping is zeros
+        self.records_written = 0
+
+        self.reserve(FILE_HEADER.size + len(header))
+        FILE_HEADER.pack_into(self.map, 0, FILE_MAGIC, len(header))
+        self.map[FILE_HEADER.size:FILE_HEADER.size + len(header)] = header
+        self.length = FILE_HEADER.size + len(header)
+        self.length += get_padding(self.length)
+
+    def reserve(self, size):
+
+        """
+        Grows the file (and its mapping) so "size" more bytes fit after the used part.
+
+        Arguments:
+            "size": The number of bytes to make room for
+
+        Returns:
+            None
+
+        """
+
+        if self.map is not None and self.length + size <= len(self.map):
+            return
+
+        capacity = self.length + size + log_growth
+
+        if self.map is not None:
+            self.map.close()
+
+        self.file.truncate(capacity) # The new part reads as zeros, so the padding never has to be written
+        self.map = mmap.mmap(self.file.fileno(), capacity)
+
+    def append(self, outputs, metadata, coordinate_transform, sequence, timestamp):
+
+        """
+        Appends one frame to the log.
+
+        Arguments:
+            "outputs": The list of output tensors from "imx500.get_outputs"
+            "metadata": The metadata dictionary from the camera
+            "coordinate_transform": The transform from "object_detection.get_coordinate_transform", so replays can convert boxes without a camera
+            "sequence": The sequence number of the frame
+            "timestamp": The monotonic time at which the frame was captured
+
+        Returns:
+            None
+
+        """
+
+        if outputs is None:
+            outputs = []
+
+        recorded_metadata = {field: metadata[field] for field in METADATA_FIELDS if field in metadata}
+        recorded_metadata["CoordinateTransform"] = list(coordinate_transform)
+        metadata_json = json.dumps(recorded_metadata, default = list).encode()
+
+        outputs = [numpy.ascontiguousarray(output) for output in outputs]
+
+        size = RECORD_HEADER.size + len(metadata_json)
+        size += get_padding(size)
+
+        for output in outputs:
+            size += TENSOR_HEADER.size + 8 * output.ndim
+            size += get_padding(size)
+            size += output.nbytes + get_padding(output.nbytes)
+
+        self.reserve(size)
+
+        record_start = self.length
+        offset = record_start + RECORD_HEADER.size
+
+        self.map[offset:offset + len(metadata_json)] = metadata_json
+        offset += len(metadata_json)
+        offset += get_padding(offset)
+
+        for output in outputs:
+
+            TENSOR_HEADER.pack_into(self.map, offset, output.dtype.str.encode(), output.ndim)
+            struct.pack_into(f"<{output.ndim}q", self.map, offset + TENSOR_HEADER.size, *output.shape)
+
+            offset += TENSOR_HEADER.size + 8 * output.ndim
+            offset += get_padding(offset)
+
+            self.map[offset:offset + output.nbytes] = memoryview(output).cast("B") # Copied straight into the mapped file
+            offset += output.nbytes + get_padding(output.nbytes)
+
+        RECORD_HEADER.pack_into(self.map, record_start, RECORD_MAGIC, len(outputs), sequence, timestamp, len(metadata_json)) # Written last, so a crash can at most cut off the last record
+
+        self.length = offset
+        self.records_written += 1
+
+    def close(self):
+
+        self.map.close()
+        self.file.truncate(self.length) # Drops the unused, preallocated part
+        self.file.close()
+
+# --- Reader ---
+
+class TensorLogReader:
+
+    """
+    Memory-maps a tensor log and gives zero-copy access to its frames.
+
+    """
+
+    def __init__(self, path):
+
+        """
+        Maps the log file and indexes its records.
+
+        Arguments:
+            "path": The path of the log file
+
+        Returns:
+            None
+
+        """
+
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        magic, header_length = FILE_HEADER.unpack_from(self.map, 0)
+
+        if magic != FILE_MAGIC:
+            raise ValueError(f"{path} is not a tensor log")
+
+        header = json.loads(self.map[FILE_HEADER.size:FILE_HEADER.size + header_length])
+
+        self.input_size = tuple(header["input_size"])
+        self.intrinsics = types.SimpleNamespace(**header["intrinsics"])
+
+        offset = FILE_HEADER.size + header_length
+        self.record_offsets = []
+
+        offset += get_padding(offset)
+
+        while offset + RECORD_HEADER.size <= len(self.map): # Finds where every complete record starts
+
+            record_end = self.skip_record(offset)
+
+            if record_end is None: # An incomplete last record (the recording was cut off)
+                break
+
+            self.record_offsets.append(offset)
+            offset = record_end
+
+    def skip_record(self, offset):
+
+        """
+        Finds the end of the record starting at "offset".
+
+        Arguments:
+            "offset": The offset of the record in the file
+
+        Returns:
+            "record_end": The offset right after the record, or None if it is incomplete
+
+        """
+
+        magic, tensor_count, _, _, metadata_length = RECORD_HEADER.unpack_from(self.map, offset)
+
+        if magic != RECORD_MAGIC:
+            return None
+
+        offset += RECORD_HEADER.size + metadata_length
+        offset += get_padding(offset)
+
+        for _ in range(tensor_count):
+
+            if offset + TENSOR_HEADER.size > len(self.map):
+                return None
+
+            dtype, ndim = TENSOR_HEADER.unpack_from(self.map, offset)
+            shape = struct.unpack_from(f"<{ndim}q", self.map, offset + TENSOR_HEADER.size)
+
+            offset += TENSOR_HEADER.size + 8 * ndim
+            offset += get_padding(offset)
+            offset += numpy.dtype(dtype.rstrip(b"\0").decode()).itemsize * int(numpy.prod(shape))
+            offset += get_padding(offset)
+
+        return offset if offset <= len(self.map) else None
+
+    def __len__(self):
+        return len(self.record_offsets)
+
+    def __getitem__(self, index):
+
+        """
+        Reads one frame of the log.
+
+        Arguments:
+            "index": The index of the frame
+
+        Returns:
+            "sequence": The sequence number of the frame
+            "timestamp": The monotonic time at which the frame was captured
+            "metadata": The recorded metadata dictionary
+            "outputs": The list of output tensors (read-only views into the mapped file)
+
+        """
+
+        offset = self.record_offsets[index]
+        _, tensor_count, sequence, timestamp, metadata_length = RECORD_HEADER.unpack_from(self.map, offset)
+
+        offset += RECORD_HEADER.size
+        metadata = json.loads(self.map[offset:offset + metadata_length])
+
+        offset += metadata_length
+        offset += get_padding(offset)
+
+        outputs = []
+
+        for _ in range(tensor_count):
+
+            dtype, ndim = TENSOR_HEADER.unpack_from(self.map, offset)
+            shape = struct.unpack_from(f"<{ndim}q", self.map, offset + TENSOR_HEADER.size)
+            dtype = numpy.dtype(dtype.rstrip(b"\0").decode())
+
+            offset += TENSOR_HEADER.size + 8 * ndim
+            offset += get_padding(offset)
+
+            count = int(numpy.prod(shape))
+            outputs.append(numpy.frombuffer(self.map, dtype = dtype, count = count, offset = offset).reshape(shape))
+
+            offset += dtype.itemsize * count
+            offset += get_padding(offset)
+
+        return sequence, timestamp, metadata, outputs
+
+    def close(self):
+        self.map.close()
+
+# --- Replay backend ---
+
+class ReplayFinished(Exception):
+
+    """
+    Raised by "ReplayCamera.capture_metadata" when every frame of the log has been replayed.
+
+    """
+
+class ReplayIMX500:
+
+    """
+    Stands in for "picamera2.devices.IMX500", serving the output tensors of a tensor log.
+
+    """
+
+    camera_num = 0
+
+    def __init__(self, log):
+
+        """
+        Creates a replayed IMX500 device.
+
+        Arguments:
+            "log": The tensor log reader
+
+        Returns:
+            None
+
+        """
+
+        self.log = log
+        self.network_intrinsics = log.intrinsics
+
+    def get_outputs(self, metadata, add_batch = False):
+        return metadata.get("ReplayOutputs")
+
+    def get_input_size(self):
+        return self.log.input_size
+
+    def convert_inference_coords(self, coords, metadata, picam2):
+
+        """
+        Converts one normalized (y0, x0, y1, x1) box with the recorded coordinate transform.
+
+        Arguments:
+            "coords": The box in "yx" order
+            "metadata": The replayed metadata dictionary
+            "picam2": Unused, kept for the same signature as IMX500
+
+        Returns:
+            "box": The box (x, y, w, h) in ISP output pixels
+
+        """
+
+        scale_x, offset_x, scale_y, offset_y, _, _ = metadata["CoordinateTransform"]
+        y0, x0, y1, x1 = coords
+
+        return (int(x0 * scale_x + offset_x), int(y0 * scale_y + offset_y), int((x1 - x0) * scale_x), int((y1 - y0) * scale_y))
+
+    def set_auto_aspect_ratio(self):
+        pass
+
+class ReplayCamera:
+
+    """
+    Stands in for "picamera2.Picamera2", returning the frames of a tensor log from "capture_metadata".
+
+    """
+
+    def __init__(self, imx500, realtime = True):
+
+        """
+        Creates a replayed camera.
+
+        Arguments:
+            "imx500": The replayed IMX500 device
+            "realtime": If True, frames are returned at the recorded pace, otherwise as fast as possible
+
+        Returns:
+            None
+
+        """
+
+        self.log = imx500.log
+        self.realtime = realtime
+        self.index = 0
+        self.start_time = None
+        self.pre_callback = None
+
+    def camera_configuration(self):
+
+        width, height = self.log[0][2]["CoordinateTransform"][4:6] if len(self.log) else (0, 0)
+
+        return {"main": {"size": (width, height)}}
+
+    def capture_metadata(self):
+
+        """
+        Returns the metadata of the next frame in the log.
+
+        Arguments:
+            None
+
+        Returns:
+            "metadata": The recorded metadata, with the output tensors under "ReplayOutputs" and the capture time under "ReplayTimestamp"
+
+        """
+
+        if self.index >= len(self.log):
+            raise ReplayFinished()
+
+        _, timestamp, metadata, outputs = self.log[self.index]
+
+        if self.start_time is None:
+            self.start_time = (time.monotonic(), timestamp)
+
+        if self.realtime: # Waits until the frame is due, relative to the first one
+            delay = (timestamp - self.start_time[1]) - (time.monotonic() - self.start_time[0])
+            if delay > 0:
+                time.sleep(delay)
+
+        if self.realtime: # Shifted onto the current clock, so frame ages (latencies) can be measured like with the camera
+            timestamp += self.start_time[0] - self.start_time[1]
+
+        metadata["ReplayOutputs"] = outputs
+        metadata["ReplayTimestamp"] = timestamp
+        self.index += 1
+
+        return metadata
+
+    def start(self, *args, **kwargs):
+        pass
+
+    def stop(self):
+        pass
@@ -0,0 +1,198 @@
+
+# --- Imports ---
+
+import collections
+import threading
+import time
+import cv2
+import numpy
+
+# --- General definitions ---
+
+DROP_OLDEST = "drop_oldest" # Replace the oldest frame that is still waiting to be encoded
+DROP_NEWEST = "drop_newest" # Throw away the incoming frame
+BLOCK = "block" # Wait until the encoder has a free buffer (slows down the caller)
+
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+# --- Recorder ---
+
+class VideoRecorder:
+
+    """
+    Encodes video frames in a dedicated worker thread, fed by a bounded ring of preallocated frame buffers.
+
+    """
+
+    def __init__(self, path, fps, size, buffer_count = 8, drop_policy = DROP_OLDEST, fourcc = "XVID"):
+
+        """
+        Opens the video file and starts the encoder worker.
+
+        Arguments:
+            "path": The path of the video file
+            "fps": Frames per second of the video
+            "size": The (width, height) of the frames
+            "buffer_count": The number of frames that can wait for the encoder
+            "drop_policy": What to do when the encoder falls behind: DROP_OLDEST, DROP_NEWEST or BLOCK
+            "fourcc": The four character code of the video codec
+
+        Returns:
+            None
+
+        """
+
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        width, height = size
+
+        self.drop_policy = drop_policy
+        self.buffers = [numpy.zeros((height, width, 3), dtype = numpy.uint8) for _ in range(buffer_count)] # Allocated once, reused for every frame
+
+        self.free_buffers = collections.deque(range(buffer_count)) # Indices of buffers that can be written
+        self.queued_buffers = collections.deque() # Indices of buffers waiting to be encoded, oldest first
+        self.condition = threading.Condition()
+        self.closing = False
+
+        self.frames_submitted = 0
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+        self.encoding_time = 0.0 # Total time spent in the encoder (in seconds)
+
+        self.video_writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+
+        self.worker_thread = threading.Thread(target = self.encoder_worker, daemon = True)
+        self.worker_thread.start()
+
+    def submit(self, frame_rgb):
+
+        """
+        Hands a frame over to the encoder. Only a color conversion into a preallocated buffer is done by the caller.
+
+        Arguments:
+            "frame_rgb": The RGB (or RGBX) frame to record
+
+        Returns:
+            "accepted": True if the frame was queued, False if it was dropped
+
+        """
+
+        with self.condition:
+
+            if self.closing:
+                return False
+
+            self.frames_submitted += 1
+
+            if not self.free_buffers: # If the encoder has fallen behind:
+
+                if self.drop_policy == DROP_NEWEST:
+                    self.frames_dropped += 1
+                    return False
+
+                if self.drop_policy == DROP_OLDEST and self.queued_buffers:
+                    self.free_buffers.append(self.queued_buffers.popleft())
+                    self.frames_dropped += 1
+
+                while not self.free_buffers and not self.closing: # BLOCK (or every buffer is being encoded)
+                    self.condition.wait()
+
+                if self.closing:
+                    return False
+
+            index = self.free_buffers.popleft()
+
+        cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR, dst = self.buffers[index]) # Converts from RGB to BGR (for OpenCV) straight into the buffer
+
+        with self.condition:
+            self.queued_buffers.append(index)
+            self.condition.notify_all()
+
+        return True
+
+    def encoder_worker(self):
+
+        """
+        Runs in a separate thread — writes queued frames to the video file until the recorder is closed, then releases the video file.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        """
+
+        while True:
+
+            with self.condition:
+
+                while not self.queued_buffers and not self.closing:
+                    self.condition.wait()
+
+                if not self.queued_buffers: # Closing and nothing left to encode
+                    break
+
+                index = self.queued_buffers.popleft()
+
+            start_time = time.perf_counter()
+            self.video_writer.write(self.buffers[index])
+            self.encoding_time += time.perf_counter() - start_time
+
+            with self.condition:
+                self.frames_encoded += 1
+                self.free_buffers.append(index)
+                self.condition.notify_all()
+
+        self.video_writer.release() # Only the worker touches the writer, so it can't be released in the middle of a write
+
+    def get_stats(self):
+
+        """
+        Gets the recording counters.
+
+        Arguments:
+            None
+
+        Returns:
+            "stats": A dictionary with the submitted, encoded, dropped and queued frame counts and the average encoding time
+
+        """
+
+        with self.condition:
+            return {
+                "submitted": self.frames_submitted,
+                "encoded": self.frames_encoded,
+                "dropped": self.frames_dropped,
+                "queued": len(self.queued_buffers),
+                "average_encoding_time": self.encoding_time / self.frames_encoded if self.frames_encoded else 0.0
+            }
+
+    def close(self, timeout = 5.0):
+
+        """
+        Encodes the frames that are still queued, then closes the video file.
+
+        Arguments:
+            "timeout": The maximum time to wait for the encoder to finish the queued frames (in seconds), the rest are dropped
+
+        Returns:
+            None
+
+        """
+
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+
+        self.worker_thread.join(timeout = timeout)
+
+        if self.worker_thread.is_alive(): # Encoding the rest takes too long: drop it, so the worker stops after the frame it is writing
+
+            with self.condition:
+                self.frames_dropped += len(self.queued_buffers)
+                self.free_buffers.extend(self.queued_buffers)
+                self.queued_buffers.clear()
+
+            self.worker_thread.join(timeout = timeout) # If it is still stuck in the encoder after this, it releases the file once the write returns